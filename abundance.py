@@ -1,12 +1,27 @@
 import json
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
 from glob import glob
 from os.path import basename
+from typing import Callable, Iterable
 
 import numpy as np
 import pandas as pd
+from scipy import sparse as sp
 
+import reportstore
+from cache import (
+    cache_key,
+    file_stats,
+    load_frame,
+    load_sparse,
+    save_frame,
+    save_sparse,
+)
 from config import DATA_DIR
 from samplenaming import fix_name
+from taxonomy import KRK_STD2_FILE, Taxonomy
 
 
 class AbundancePaths:
@@ -23,6 +38,10 @@ class AbundancePaths:
     SPECIES2 = f'{DATA_DIR}/ww2-kraken/*.vir.json'
     GENUS2 = f'{DATA_DIR}/ww2-kraken/*.gen.json'
 
+    # Kraken reports, for load_store.
+    REPORTS = f'{DATA_DIR}/ww-kraken/*.krk.txt'
+    REPORTS2 = f'{DATA_DIR}/ww2-kraken/*.krk.txt'
+
 
 SPIKE_TAXA = [
     'NC_003045',  # Bovine covid
@@ -64,61 +83,135 @@ SPIKE_TAXA = [
 ]
 
 
+Columns = Iterable[str] | Callable[[str], bool] | int
+"""Column selection: labels, a predicate on labels, or the number of columns
+with the largest totals."""
+
+
+@dataclass
+class SparseAbundance:
+    """A sparse samples x taxa matrix with its labels."""
+
+    values: sp.csr_array
+    index: list[str]
+    columns: list[str]
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.values.shape
+
+    @cached_property
+    def column_totals(self) -> np.ndarray:
+        """Sum of each column. Computed once, as values are not modified."""
+        return np.asarray(self.values.sum(axis=0)).ravel()
+
+    def to_frame(self) -> pd.DataFrame:
+        """Returns a dense data frame with the same data."""
+        return pd.DataFrame(
+            self.values.toarray(),
+            index=pd.Index(self.index, name='name'),
+            columns=self.columns,
+        )
+
+
 def load_data(
     glb: str,
     remove_spike: bool | str,
     exp_files=36,
     normalize=True,
     phylum_mode=False,
-) -> pd.DataFrame:
+    use_cache=True,
+    sparse=False,
+    level: str = None,
+    columns: Columns = None,
+) -> 'pd.DataFrame | SparseAbundance':
+    """Loads per-sample abundances into a samples x taxa matrix.
+
+    If level is given, glb should match tax ID files (like BY_TID). The tax ID
+    matrix is loaded (and cached) once, and summed into taxa at that level
+    (like 'G' or 'P'), so all levels share the same parsed files. Spike-in
+    taxa are removed on both sides of the rollup, see rollup_without_spike.
+
+    If columns is given, only those taxa are returned. Labels and predicates
+    are applied while reading, so other taxa are never materialized, except
+    with level or phylum_mode, where they apply to the summed taxa. Values are
+    normalized by the totals of all taxa either way. Top columns are ranked by
+    the returned values, so by their mean fraction if normalize is true.
+    Results of predicates are not cached.
+    """
+    columns = _columns_arg(columns)
+    if level:
+        df = load_data(
+            glb,
+            False,
+            exp_files,
+            normalize=False,
+            use_cache=use_cache,
+            sparse=sparse,
+        )
+        df = sort_columns(rollup_without_spike(df, level, remove_spike))
+        return _project(df, columns, normalize)
+
     files = glob(glb)
-    files = [f for f in files if 'Undetermined' not in f]
+    files = sorted((f for f in files if 'Undetermined' not in f), key=fix_name)
     if exp_files:
         assert len(files) == exp_files, f'expected {exp_files}, got {len(files)}'
     print(len(files), 'files')
-    jsons = (json.load(open(f)) for f in files)
-
-    df = (
-        pd.DataFrame(jsons)
-        .assign(name=[fix_name(f) for f in files])
-        .set_index('name')
-        .replace(np.nan, 0)
-        .sort_index()
+
+    if callable(columns):
+        use_cache = False
+    key = cache_key(
+        'load_data',
+        glb,
+        file_stats(files),
+        remove_spike,
+        SPIKE_TAXA if remove_spike else None,
+        normalize,
+        phylum_mode,
+        sparse,
+        _columns_key(columns),
     )
+    if use_cache and (df := _load_cached(key, sparse)) is not None:
+        print('Loaded from cache')
+        return df
+
+    # Labels and predicates are pushed into the reader, but phylum labels
+    # and top columns are only known after reading everything.
+    pushdown = columns is not None and not phylum_mode and not _is_top(columns)
+    keep = column_predicate(columns) if pushdown else None
+    names = [fix_name(f) for f in files]
+    df, totals, spike = _read_jsons(files, names, sparse=sparse, keep=keep)
     df = sort_columns(df)
 
     if phylum_mode:
         # Split columns into species and phylum.
         # Using species for spike removal, then assigning phylum again.
-        spc, phy = [], []
-        for c in df.columns.tolist():
+        spc = []
+        for c in df.columns:
             s = c.split(',')
             assert len(s) == 2, f'{c!r}: {len(s)} parts'
             spc.append(s[0])
-            phy.append(s[1])
-        df.columns = spc
 
     if remove_spike:
-        keep = [True] * df.shape[1]
-        print('Removing spike:')
-        for x in SPIKE_TAXA:
-            if x in df:
-                if type(remove_spike) is str:
-                    df[remove_spike] += df[x]
-                keep[df.columns.get_loc(x)] = False
-                # del df[x]
-                print('-', x)
-        df = df.loc[:, keep]
+        if pushdown:
+            df = remove_spike_taxa(df, remove_spike, spike=spike)
+            if type(remove_spike) is not str:
+                totals = totals - spike
+        else:
+            df = remove_spike_taxa(df, remove_spike, spc if phylum_mode else None)
 
     if phylum_mode:
         # Sum by phylum.
-        phy = [x for x, k in zip(phy, keep) if k]
-        df.columns = phy
-        df = df.groupby(df.columns, axis=1).sum()
+        df = sum_columns(df, [c.split(',')[1] for c in df.columns])
 
-    if normalize:  # Normalize to 1
-        df = df.div(df.sum(axis=1), axis=0)
+    if pushdown:
+        if normalize:  # Normalize to 1
+            df = normalize_rows(df, totals)
+    else:
+        df = _project(df, columns, normalize)
 
+    if use_cache:
+        _save_cached(key, df)
     return df
 
 
@@ -128,67 +221,516 @@ def load_data2(
     exp_files=281,
     normalize=True,
     phylum_mode=False,
-) -> pd.DataFrame:
+    use_cache=True,
+    sparse=False,
+) -> 'pd.DataFrame | SparseAbundance':
     files = glob(glb)
     if exp_files:
         assert len(files) == exp_files, f'expected {exp_files}, got {len(files)}'
     print(len(files), 'files')
-    jsons = (json.load(open(f)) for f in files)
-
-    df = (
-        pd.DataFrame(jsons)
-        .assign(name=[clean_file_name(f) for f in files])
-        .set_index('name')
-        .replace(np.nan, 0)
-        .sort_index()
+
+    key = cache_key(
+        'load_data2',
+        glb,
+        file_stats(files),
+        remove_spike,
+        SPIKE_TAXA if remove_spike else None,
+        normalize,
+        sparse,
     )
-    df = sort_columns(df)
+    if use_cache and (df := _load_cached(key, sparse)) is not None:
+        print('Loaded from cache')
+        return df
 
-    # if phylum_mode:
-    #     # Split columns into species and phylum.
-    #     # Using species for spike removal, then assigning phylum again.
-    #     spc, phy = [], []
-    #     for c in df.columns.tolist():
-    #         s = c.split(',')
-    #         assert len(s) == 2, f'{c!r}: {len(s)} parts'
-    #         spc.append(s[0])
-    #         phy.append(s[1])
-    #     df.columns = spc
+    df = read_jsons(files, [clean_file_name(f) for f in files], sparse=sparse)
+    df = sort_columns(sort_rows(df))
 
     if remove_spike:
-        keep = [True] * df.shape[1]
-        print('Removing spike:')
-        for x in SPIKE_TAXA:
-            if x in df:
-                if type(remove_spike) is str:
-                    df[remove_spike] += df[x]
-                keep[df.columns.get_loc(x)] = False
-                # del df[x]
-                print('-', x)
-        df = df.loc[:, keep]
+        df = remove_spike_taxa(df, remove_spike)
 
     # Remove empty samples.
-    nbefore = len(df)
-    df = df[df.sum(axis=1) != 0]
-    nafter = len(df)
+    nbefore = len(df.index)
+    df = select_rows(df, row_sums(df) != 0)
+    nafter = len(df.index)
     print('Empty samples removed:', nbefore - nafter)
 
-    # if phylum_mode:
-    #     # Sum by phylum.
-    #     phy = [x for x, k in zip(phy, keep) if k]
-    #     df.columns = phy
-    #     df = df.groupby(df.columns, axis=1).sum()
-
     if normalize:  # Normalize to 1
-        df = df.div(df.sum(axis=1), axis=0)
+        df = normalize_rows(df)
 
+    if use_cache:
+        _save_cached(key, df)
     return df
 
 
-def sort_columns(df: pd.DataFrame) -> pd.DataFrame:
-    column_sums = df.sum(axis=0)
-    column_sums = column_sums.sort_values(ascending=False)
-    return df.reindex(columns=column_sums.index)
+def load_store(
+    glb: str,
+    rank='S',
+    domain: str | None = 'Viruses',
+    remove_spike: bool | str = False,
+    normalize=True,
+    labels='name',
+    other=False,
+    sparse=False,
+    name_func=fix_name,
+    workers=None,
+    columns: Columns = None,
+) -> 'pd.DataFrame | SparseAbundance':
+    """Loads clade read counts at a rank from Kraken reports into a samples x
+    taxa matrix.
+
+    The reports are parsed once into a report store with all ranks, which is
+    reused until they change. labels is 'name' or 'tid', and taxa sharing a
+    label are summed. If other is true, the reads that are not in the selected
+    taxa, including unclassified reads, are added as 'Other', so normalized
+    values are fractions of all reads. columns selects taxa like in load_data,
+    and only their columns are read from the store.
+    """
+    columns = _columns_arg(columns)
+    store = report_store(glb, name_func, workers)
+
+    cols = store.select(rank, domain)
+    names = store.taxa[labels][cols]
+    rank_totals = store.counts[:, cols].sum(axis=1)
+    spike = store.counts[:, cols[spike_mask(tuple(names))]].sum(axis=1)
+    if columns is not None and not _is_top(columns):
+        mask = column_mask(names, columns)
+        cols, names = cols[mask], names[mask]
+
+    values = sp.csr_array(store.counts[:, cols], dtype=float)
+    df = sum_columns(SparseAbundance(values, store.samples, names.tolist()), names)
+    totals = rank_totals
+    if other:
+        rest = store.totals() - rank_totals
+        values = sp.csr_array(sp.hstack([df.values, rest[:, np.newaxis]]))
+        df = SparseAbundance(values, df.index, df.columns + ['Other'])
+        totals = store.totals()
+
+    if remove_spike:
+        df = remove_spike_taxa(df, remove_spike, spike=spike)
+        if type(remove_spike) is not str:
+            totals = totals - spike
+
+    df = sort_columns(df)
+    if normalize:
+        df = normalize_rows(df, totals)
+    if _is_top(columns):
+        df = select_columns(df, columns)
+    df = sort_rows(df)
+    return df if sparse else df.to_frame()
+
+
+def report_store(glb: str, name_func=fix_name, workers=None) -> reportstore.ReportStore:
+    """Returns the report store of the Kraken reports that match glb."""
+    files = sorted(f for f in glob(glb) if 'Undetermined' not in f)
+    print(len(files), 'files')
+    return reportstore.load(files, [name_func(f) for f in files], workers)
+
+
+def read_jsons(
+    files: list[str], names: list[str], workers=None, sparse=False
+) -> pd.DataFrame | SparseAbundance:
+    """Reads per-sample taxon-to-count JSON files into a samples x taxa matrix.
+
+    Files are parsed in a process pool. Each parsed sample is reduced to its
+    column indexes and values, and scattered into a preallocated matrix, so
+    memory is proportional to the matrix rather than to the parsed dicts.
+    """
+    return _read_jsons(files, names, workers, sparse)[0]
+
+
+def _read_jsons(
+    files: list[str],
+    names: list[str],
+    workers=None,
+    sparse=False,
+    keep: Callable[[str], bool] = None,
+) -> tuple[pd.DataFrame | SparseAbundance, np.ndarray, np.ndarray]:
+    """Like read_jsons, but only materializes the columns whose labels match
+    keep. Also returns the total and the spike-in total of each row over all
+    labels."""
+    columns: dict[str, int] = {}  # -1 for labels that are not kept.
+    labels: list[str] = []
+
+    def column(k: str) -> int:
+        if (c := columns.get(k)) is None:
+            c = columns[k] = len(labels) if keep is None or keep(k) else -1
+            if c >= 0:
+                labels.append(k)
+        return c
+
+    rows, cols, vals = [], [], []
+    totals, spike = np.zeros(len(files)), np.zeros(len(files))
+    with ProcessPoolExecutor(workers) as pool:
+        parsed = pool.map(_read_json, files, chunksize=8)
+        for i, (keys, v, spike_total) in enumerate(parsed):
+            idx = np.fromiter(
+                (column(k) for k in keys), dtype=np.int64, count=len(keys)
+            )
+            totals[i], spike[i] = v.sum(), spike_total
+            if keep is not None:
+                kept = idx >= 0
+                idx, v = idx[kept], v[kept]
+            rows.append(np.full(len(idx), i))
+            cols.append(idx)
+            vals.append(v)
+
+    shape = (len(files), len(labels))
+    if sparse:
+        if not labels:
+            df = SparseAbundance(sp.csr_array(shape), names, [])
+        else:
+            values = sp.csr_array(
+                (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                shape=shape,
+            )
+            df = SparseAbundance(values, names, labels)
+        return df, totals, spike
+
+    values = np.zeros(shape)
+    if labels:
+        values[np.concatenate(rows), np.concatenate(cols)] = np.concatenate(vals)
+    df = pd.DataFrame(values, index=pd.Index(names, name='name'), columns=labels)
+    return df, totals, spike
+
+
+def _read_json(f: str) -> tuple[list[str], np.ndarray, float]:
+    with open(f) as fp:
+        d: dict[str, float] = json.load(fp)
+    keys = list(d)
+    v = np.fromiter(d.values(), dtype=float, count=len(d))
+    return keys, v, v[pd.Index(keys).isin(SPIKE_TAXA)].sum()
+
+
+def sort_columns(df: pd.DataFrame | SparseAbundance) -> pd.DataFrame | SparseAbundance:
+    """Sorts columns by descending total."""
+    order = np.argsort(-column_totals(df), kind='stable')
+    if isinstance(df, SparseAbundance):
+        return SparseAbundance(
+            df.values[:, order], df.index, [df.columns[i] for i in order]
+        )
+    return df.iloc[:, order]
+
+
+def column_totals(
+    df: pd.DataFrame | SparseAbundance, totals: np.ndarray = None
+) -> np.ndarray:
+    """Returns the sum of each column, or the given precomputed totals."""
+    if totals is not None:
+        return totals
+    if isinstance(df, SparseAbundance):
+        return df.column_totals
+    return df.sum(axis=0).values
+
+
+def top_columns(
+    df: pd.DataFrame | SparseAbundance, n: int, totals: np.ndarray = None
+) -> list[str]:
+    """Returns the labels of the n columns with the largest totals, by
+    descending total. Only those columns are sorted."""
+    return [df.columns[i] for i in _top_indices(column_totals(df, totals), n)]
+
+
+def top_k(
+    df: pd.DataFrame | SparseAbundance,
+    n: int,
+    totals: np.ndarray = None,
+    other='Other',
+) -> pd.DataFrame | SparseAbundance:
+    """Returns the n columns with the largest totals, by descending total, and
+    a last column with the rest of each row. An existing column named other
+    is counted among the n but always summed into the rest."""
+    idx = _top_indices(column_totals(df, totals), n)
+    idx = idx[[df.columns[i] != other for i in idx]]
+    labels = [df.columns[i] for i in idx] + [other]
+    if isinstance(df, SparseAbundance):
+        top = df.values[:, idx]
+        rest = row_sums(df) - top.sum(axis=1)
+        values = sp.csr_array(sp.hstack([top, rest[:, np.newaxis]]))
+        return SparseAbundance(values, df.index, labels)
+    top = df.values[:, idx]
+    rest = df.values.sum(axis=1) - top.sum(axis=1)
+    return pd.DataFrame(np.column_stack([top, rest]), index=df.index, columns=labels)
+
+
+def _top_indices(totals: np.ndarray, n: int) -> np.ndarray:
+    """Returns the positions of the n largest totals, by descending total and
+    then position, without sorting all totals."""
+    n = min(n, len(totals))
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64)
+    kth = -np.partition(-totals, n - 1)[n - 1]
+    above = np.flatnonzero(totals > kth)
+    ties = np.flatnonzero(totals == kth)[: n - len(above)]
+    idx = np.concatenate([above, ties])
+    return idx[np.lexsort((idx, -totals[idx]))]
+
+
+def sort_rows(df: pd.DataFrame | SparseAbundance) -> pd.DataFrame | SparseAbundance:
+    """Sorts rows by sample name."""
+    if isinstance(df, SparseAbundance):
+        order = np.argsort(df.index, kind='stable')
+        return SparseAbundance(
+            df.values[order], [df.index[i] for i in order], df.columns
+        )
+    return df.sort_index()
+
+
+def select_rows(
+    df: pd.DataFrame | SparseAbundance, mask: np.ndarray
+) -> pd.DataFrame | SparseAbundance:
+    """Returns the rows where mask is true."""
+    if isinstance(df, SparseAbundance):
+        index = [x for x, m in zip(df.index, mask) if m]
+        return SparseAbundance(df.values[mask], index, df.columns)
+    return df[mask]
+
+
+def row_sums(df: pd.DataFrame | SparseAbundance) -> np.ndarray:
+    if isinstance(df, SparseAbundance):
+        return df.values.sum(axis=1)
+    return df.sum(axis=1).values
+
+
+def normalize_rows(
+    df: pd.DataFrame | SparseAbundance, totals: np.ndarray = None
+) -> pd.DataFrame | SparseAbundance:
+    """Divides each row by its sum, or by the given row totals."""
+    if isinstance(df, SparseAbundance):
+        with np.errstate(divide='ignore'):
+            scale = 1 / (row_sums(df) if totals is None else totals)
+        scale[np.isinf(scale)] = 0
+        values = sp.csr_array(sp.diags_array(scale) @ df.values)
+        return SparseAbundance(values, df.index, df.columns)
+    return df.div(df.sum(axis=1) if totals is None else totals, axis=0)
+
+
+def column_predicate(columns: Iterable[str] | Callable[[str], bool]):
+    """Returns a label predicate for column labels or a predicate."""
+    if callable(columns):
+        return columns
+    return frozenset(columns).__contains__
+
+
+def column_mask(
+    labels: Iterable[str], columns: Iterable[str] | Callable[[str], bool]
+) -> np.ndarray:
+    """Returns a mask of the labels selected by column labels or a predicate."""
+    labels = list(labels)
+    columns = _columns_arg(columns)
+    if callable(columns):
+        return np.fromiter(map(columns, labels), dtype=bool, count=len(labels))
+    return pd.Index(labels).isin(columns)
+
+
+def select_columns(
+    df: pd.DataFrame | SparseAbundance, columns: Columns
+) -> pd.DataFrame | SparseAbundance:
+    """Returns the selected columns, in their current order. If columns is an
+    int, returns that many columns with the largest totals."""
+    if _is_top(columns):
+        idx = np.sort(_top_indices(column_totals(df), columns))
+    else:
+        idx = np.flatnonzero(column_mask(df.columns, columns))
+    return _take_columns(df, idx)
+
+
+def _take_columns(
+    df: pd.DataFrame | SparseAbundance, idx: np.ndarray
+) -> pd.DataFrame | SparseAbundance:
+    if isinstance(df, SparseAbundance):
+        return SparseAbundance(
+            df.values[:, idx], df.index, [df.columns[i] for i in idx]
+        )
+    return df.iloc[:, idx]
+
+
+def _columns_arg(columns: Columns) -> Columns:
+    """Returns column labels as a list, so iterators can be used more than
+    once."""
+    if columns is None or callable(columns) or _is_top(columns):
+        return columns
+    return list(columns)
+
+
+def _is_top(columns: Columns) -> bool:
+    return isinstance(columns, int) and not isinstance(columns, bool)
+
+
+def _columns_key(columns: Columns):
+    if callable(columns):
+        return repr(columns)  # Not cached.
+    if columns is None or _is_top(columns):
+        return columns
+    return sorted(columns)
+
+
+def _project(
+    df: pd.DataFrame | SparseAbundance, columns: Columns, normalize: bool
+) -> pd.DataFrame | SparseAbundance:
+    """Normalizes rows by the totals of all columns, then selects columns, so
+    top columns are ranked by the returned values."""
+    if normalize:
+        df = normalize_rows(df)
+    if columns is not None:
+        df = select_columns(df, columns)
+    return df
+
+
+def remove_spike_taxa(
+    df: pd.DataFrame | SparseAbundance,
+    remove_spike: bool | str,
+    names: list[str] = None,
+    spike: np.ndarray = None,
+) -> pd.DataFrame | SparseAbundance:
+    """Removes spike-in taxa columns.
+
+    If remove_spike is a string, the spike is added to the column with that
+    name. Names are matched against SPIKE_TAXA, and default to the column
+    labels. For matrices with only some of the columns, spike gives the spike
+    of each row over all columns, and a missing spike column is skipped.
+    """
+    if names is None:
+        names = df.columns
+    names = tuple(names)
+    mask = spike_mask(names)
+    print('Removing spike:')
+    for i in np.flatnonzero(mask):
+        print('-', names[i])
+    fold = type(remove_spike) is str and (spike is None or remove_spike in names)
+
+    if isinstance(df, SparseAbundance):
+        values = df.values
+        if fold:
+            if spike is None:
+                spike = values[:, mask].sum(axis=1)
+            values = _add_to_column(values, names.index(remove_spike), spike)
+        columns = [df.columns[i] for i in np.flatnonzero(~mask)]
+        return SparseAbundance(values[:, ~mask], df.index, columns)
+
+    values = df.values
+    if fold:
+        values = values.copy()
+        if spike is None:
+            spike = values[:, mask].sum(axis=1)
+        values[:, names.index(remove_spike)] += spike
+    return pd.DataFrame(values[:, ~mask], index=df.index, columns=df.columns[~mask])
+
+
+@lru_cache(maxsize=16)
+def spike_mask(names: tuple[str, ...]) -> np.ndarray:
+    """Returns a read-only boolean mask of the SPIKE_TAXA among the given
+    column names. Cached per column index."""
+    mask = pd.Index(names).isin(SPIKE_TAXA)
+    mask.flags.writeable = False
+    return mask
+
+
+def _add_to_column(values: sp.csr_array, i: int, x: np.ndarray) -> sp.csr_array:
+    n = len(x)
+    add = sp.csr_array((x, (np.arange(n), np.full(n, i))), shape=values.shape)
+    return sp.csr_array(values + add)
+
+
+def sum_columns(
+    df: pd.DataFrame | SparseAbundance, labels: list[str]
+) -> pd.DataFrame | SparseAbundance:
+    """Relabels columns and sums columns that share a label.
+
+    Result columns are sorted by label.
+    """
+    groups, uniques = _group_matrix(labels)
+    if isinstance(df, SparseAbundance):
+        return SparseAbundance(sp.csr_array(df.values @ groups), df.index, uniques)
+    return pd.DataFrame(groups.T.dot(df.values.T).T, index=df.index, columns=uniques)
+
+
+def _group_matrix(labels) -> tuple[sp.csr_array, list[str]]:
+    """Returns a sparse column-to-label indicator matrix, and the sorted unique
+    labels."""
+    codes, uniques = pd.factorize(np.array(labels, dtype=object), sort=True)
+    groups = sp.csr_array(
+        (np.ones(len(codes)), (np.arange(len(codes)), codes)),
+        shape=(len(codes), len(uniques)),
+    )
+    return groups, uniques.tolist()
+
+
+def rollup(
+    df: pd.DataFrame | SparseAbundance, level: str, taxonomy_file=KRK_STD2_FILE
+) -> pd.DataFrame | SparseAbundance:
+    """Sums tax ID columns into their ancestors at the given level.
+
+    Result columns are ancestor names. Columns without an ancestor at that
+    level are summed into 'Other'.
+    """
+    groups, labels = _rollup_matrix(tuple(df.columns), level, taxonomy_file)
+    if isinstance(df, SparseAbundance):
+        return SparseAbundance(sp.csr_array(df.values @ groups), df.index, labels)
+    return pd.DataFrame(groups.T.dot(df.values.T).T, index=df.index, columns=labels)
+
+
+def rollup_without_spike(
+    df: pd.DataFrame | SparseAbundance,
+    level: str,
+    remove_spike: bool | str,
+    taxonomy_file=KRK_STD2_FILE,
+) -> pd.DataFrame | SparseAbundance:
+    """Rolls tax ID columns up to a level, removing spike-in taxa if
+    remove_spike is set (like in remove_spike_taxa).
+
+    Spike species and their strains are matched by tax ID or name and removed
+    before the rollup. Spike taxa at higher levels, like 'Mastadenovirus', are
+    matched by name and removed after it.
+    """
+    if not remove_spike:
+        return rollup(df, level, taxonomy_file)
+    mask = spike_tid_mask(tuple(df.columns), taxonomy_file)
+    print('Removing', mask.sum(), 'spike tax IDs')
+    spike = row_sums(_take_columns(df, np.flatnonzero(mask)))
+    df = rollup(_take_columns(df, np.flatnonzero(~mask)), level, taxonomy_file)
+    rolled = np.flatnonzero(spike_mask(tuple(df.columns)))
+    spike = spike + row_sums(_take_columns(df, rolled))
+    return remove_spike_taxa(df, remove_spike, spike=spike)
+
+
+@lru_cache(maxsize=16)
+def spike_tid_mask(tids: tuple[str, ...], taxonomy_file=KRK_STD2_FILE) -> np.ndarray:
+    """Returns a read-only mask of the tax IDs that are in SPIKE_TAXA, or are
+    species (or below) named in SPIKE_TAXA, or descend from one."""
+    tax = Taxonomy.load(taxonomy_file)
+    named = pd.Index(tax.names).isin(SPIKE_TAXA) & tax.level_mask('S')
+    named |= pd.Index(tax.tids).isin(SPIKE_TAXA)
+    spike = tax.tids[tax.descendants(np.flatnonzero(named))]
+    mask = pd.Index(tids).isin(spike) | spike_mask(tids)
+    mask.flags.writeable = False
+    return mask
+
+
+@lru_cache(maxsize=16)
+def _rollup_matrix(
+    tids: tuple[str, ...], level: str, taxonomy_file: str
+) -> tuple[sp.csr_array, list[str]]:
+    """Returns a sparse tax ID to ancestor indicator matrix, and the ancestor
+    names."""
+    tax = Taxonomy.load(taxonomy_file)
+    ancestors = tax.ancestor_at(tax.index(tids), level)
+    names = np.where(ancestors >= 0, tax.names[ancestors], 'Other')
+    return _group_matrix(names)
+
+
+def _load_cached(key: str, sparse: bool) -> pd.DataFrame | SparseAbundance | None:
+    if not sparse:
+        return load_frame(key)
+    if (cached := load_sparse(key)) is None:
+        return None
+    return SparseAbundance(*cached)
+
+
+def _save_cached(key: str, df: pd.DataFrame | SparseAbundance):
+    if isinstance(df, SparseAbundance):
+        save_sparse(key, df.values, df.index, df.columns)
+    else:
+        save_frame(key, df)
 
 
 def clean_file_name(f: str) -> str:
@@ -0,0 +1,185 @@
+"""Alpha-diversity metrics of all samples at once.
+
+Inputs are samples x taxa matrices: numpy arrays, scipy sparse arrays, data
+frames or SparseAbundance objects. Metrics are computed from the nonzero
+entries only, so sparse inputs are never densified. Empty samples get NaN
+for all metrics but richness and chao1.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse as sp
+
+
+def alpha_diversity(x, depth: int = None, seed=0) -> pd.DataFrame:
+    """Returns a samples x metrics data frame of all alpha-diversity metrics.
+
+    If depth is given, x must hold read counts, and each sample is first
+    subsampled to depth reads. Samples with fewer reads get NaN. chao1 is NaN
+    unless x holds integer counts.
+    """
+    index = _index(x)
+    x = getattr(x, 'values', x)
+    if depth is not None:
+        ok = _totals(x) >= depth
+        rows = np.flatnonzero(ok)
+        result = alpha_diversity(subsample(x[rows], depth, seed))
+        result = result.set_axis(rows).reindex(range(len(ok)))
+        return result.set_axis(index)
+
+    data, rows, n = _nonzeros(x)
+    sum_squares = _sum_squares(data, rows, n)
+    return pd.DataFrame(
+        {
+            'richness': np.bincount(rows, minlength=n),
+            'shannon': _shannon(data, rows, n),
+            'simpson': 1 - sum_squares,
+            'inv_simpson': 1 / sum_squares,
+            'pielou': _pielou(data, rows, n),
+            'chao1': _chao1(data, rows, n),
+        },
+        index=index,
+    )
+
+
+def richness(x) -> np.ndarray:
+    """Returns the number of observed taxa in each sample."""
+    _, rows, n = _nonzeros(getattr(x, 'values', x))
+    return np.bincount(rows, minlength=n)
+
+
+def shannon(x) -> np.ndarray:
+    """Returns the Shannon entropy (natural log) of each sample."""
+    return _shannon(*_nonzeros(getattr(x, 'values', x)))
+
+
+def simpson(x) -> np.ndarray:
+    """Returns the Gini-Simpson index (1 - sum of squared proportions) of each
+    sample."""
+    return 1 - _sum_squares(*_nonzeros(getattr(x, 'values', x)))
+
+
+def inv_simpson(x) -> np.ndarray:
+    """Returns the inverse Simpson index of each sample."""
+    return 1 / _sum_squares(*_nonzeros(getattr(x, 'values', x)))
+
+
+def pielou(x) -> np.ndarray:
+    """Returns Pielou's evenness (Shannon over log richness) of each sample,
+    NaN for samples with fewer than 2 taxa."""
+    return _pielou(*_nonzeros(getattr(x, 'values', x)))
+
+
+def chao1(x) -> np.ndarray:
+    """Returns the bias-corrected Chao1 richness estimate of each sample.
+
+    x must hold integer read counts.
+    """
+    data, rows, n = _nonzeros(getattr(x, 'values', x))
+    if not _is_integral(data):
+        raise ValueError('chao1 needs integer counts')
+    return _chao1(data, rows, n)
+
+
+def subsample(counts, depth: int, seed=0):
+    """Returns counts with each sample randomly subsampled to depth reads,
+    without replacement.
+
+    Sparse inputs give sparse outputs. Raises ValueError if a sample has
+    fewer than depth reads or counts are not integers.
+    """
+    counts = getattr(counts, 'values', counts)
+    rng = np.random.default_rng(seed)
+    if sp.issparse(counts):
+        csr = sp.csr_array(counts)
+        _check_counts(csr.data, _totals(csr), depth)
+        data = np.empty_like(csr.data, dtype=np.int64)
+        for i in range(csr.shape[0]):
+            a, b = csr.indptr[i], csr.indptr[i + 1]
+            data[a:b] = rng.multivariate_hypergeometric(
+                csr.data[a:b].astype(np.int64), depth
+            )
+        result = sp.csr_array((data, csr.indices, csr.indptr), shape=csr.shape)
+        result.eliminate_zeros()
+        return result
+
+    counts = np.asarray(counts)
+    _check_counts(counts, _totals(counts), depth)
+    result = np.zeros(counts.shape, dtype=np.int64)
+    for i, row in enumerate(counts):
+        nz = np.flatnonzero(row)
+        result[i, nz] = rng.multivariate_hypergeometric(row[nz].astype(np.int64), depth)
+    return result
+
+
+def _check_counts(values: np.ndarray, totals: np.ndarray, depth: int):
+    if not _is_integral(values):
+        raise ValueError('subsampling needs integer counts')
+    if (totals < depth).any():
+        raise ValueError(
+            f'{(totals < depth).sum()} samples have fewer than {depth} reads'
+        )
+
+
+def _index(x) -> list:
+    if hasattr(x, 'index'):
+        return list(x.index)
+    return list(range(x.shape[0]))
+
+
+def _totals(x) -> np.ndarray:
+    return np.asarray(x.sum(axis=1)).ravel()
+
+
+def _nonzeros(x) -> tuple[np.ndarray, np.ndarray, int]:
+    """Returns the nonzero values of x, their row numbers and the number of
+    rows."""
+    if sp.issparse(x):
+        csr = sp.csr_array(x)
+        rows = np.repeat(np.arange(csr.shape[0]), np.diff(csr.indptr))
+        nz = csr.data != 0
+        return csr.data[nz], rows[nz], csr.shape[0]
+    x = np.asarray(x)
+    rows, cols = np.nonzero(x)
+    return x[rows, cols], rows, x.shape[0]
+
+
+def _proportions(data: np.ndarray, rows: np.ndarray, n: int) -> np.ndarray:
+    totals = np.bincount(rows, weights=data, minlength=n)
+    return data / totals[rows]
+
+
+def _shannon(data: np.ndarray, rows: np.ndarray, n: int) -> np.ndarray:
+    p = _proportions(data, rows, n)
+    h = np.bincount(rows, weights=-p * np.log(p), minlength=n)
+    return _nan_if_empty(h, rows)
+
+
+def _sum_squares(data: np.ndarray, rows: np.ndarray, n: int) -> np.ndarray:
+    p = _proportions(data, rows, n)
+    return _nan_if_empty(np.bincount(rows, weights=p**2, minlength=n), rows)
+
+
+def _nan_if_empty(values: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Sets NaN for samples without any nonzero values."""
+    empty = np.bincount(rows, minlength=len(values)) == 0
+    return np.where(empty, np.nan, values)
+
+
+def _pielou(data: np.ndarray, rows: np.ndarray, n: int) -> np.ndarray:
+    s = np.bincount(rows, minlength=n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(s > 1, _shannon(data, rows, n) / np.log(s), np.nan)
+
+
+def _chao1(data: np.ndarray, rows: np.ndarray, n: int) -> np.ndarray:
+    if not _is_integral(data):
+        return np.full(n, np.nan)
+    s = np.bincount(rows, minlength=n)
+    f1 = np.bincount(rows, weights=data == 1, minlength=n)
+    f2 = np.bincount(rows, weights=data == 2, minlength=n)
+    return s + f1 * (f1 - 1) / (2 * (f2 + 1))
+
+
+def _is_integral(values: np.ndarray) -> bool:
+    return values.dtype.kind in 'iu' or bool((values == np.round(values)).all())
@@ -0,0 +1,56 @@
+"""Reduces long tracks to the resolution they are drawn at."""
+
+from typing import NamedTuple
+
+import numpy as np
+from matplotlib import pyplot as plt
+from matplotlib.axes import Axes
+
+
+class BinnedTrack(NamedTuple):
+    x: np.ndarray
+    """Center position of each bin."""
+    low: np.ndarray
+    high: np.ndarray
+    mean: np.ndarray
+
+
+def bin_track(y: np.ndarray, nbins: int) -> BinnedTrack:
+    """Returns the min, max and mean of y in nbins equal-width bins.
+
+    Tracks that are not longer than nbins are returned as is.
+    """
+    y = np.asarray(y)
+    if len(y) <= nbins:
+        return BinnedTrack(np.arange(len(y)), y, y, y)
+    edges = np.linspace(0, len(y), nbins + 1).astype(int)
+    starts = edges[:-1]
+    return BinnedTrack(
+        (edges[:-1] + edges[1:] - 1) / 2,
+        np.minimum.reduceat(y, starts),
+        np.maximum.reduceat(y, starts),
+        np.add.reduceat(y, starts, dtype=float) / np.diff(edges),
+    )
+
+
+def axes_width_px(ax: Axes = None, dpi: float = None) -> int:
+    """Returns the width of the axes in pixels, for the given output dpi.
+
+    Uses the figure's dpi by default.
+    """
+    ax = ax or plt.gca()
+    dpi = dpi or ax.figure.dpi
+    return max(1, int(ax.get_position().width * ax.figure.get_figwidth() * dpi))
+
+
+def plot_track(y: np.ndarray, ax: Axes = None, dpi: float = None, **kwargs):
+    """Plots a track reduced to one bin per pixel.
+
+    Each bin is drawn as a vertical stroke from its min to its max, which
+    looks the same as drawing every point. Keyword arguments go to plot.
+    """
+    ax = ax or plt.gca()
+    b = bin_track(y, axes_width_px(ax, dpi))
+    xx = np.repeat(b.x, 2)
+    yy = np.column_stack([b.low, b.high]).ravel()
+    return ax.plot(xx, yy, **kwargs)
@@ -0,0 +1,106 @@
+"""On-disk cache for intermediate results."""
+
+import hashlib
+import json
+import os
+from os import path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from config import CACHE_DIR
+
+CACHE_VERSION = 2
+"""Bump to invalidate all existing cache entries. Keys cover the inputs and
+arguments of cached functions, not their code, so bump this whenever the
+output of a cached loader changes."""
+
+
+def file_stats(files: list[str]) -> list[tuple[str, int, int]]:
+    """Returns (path, mtime, size) for each file, for use in cache keys."""
+    stats = []
+    for f in sorted(files):
+        st = os.stat(f)
+        stats.append((path.abspath(f), st.st_mtime_ns, st.st_size))
+    return stats
+
+
+def cache_key(*parts) -> str:
+    """Returns a hash of the given JSON-serializable parts."""
+    raw = json.dumps([CACHE_VERSION, *parts], default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def array_key(*arrays: np.ndarray) -> str:
+    """Returns a hash of the contents, shapes and types of the given arrays."""
+    h = hashlib.sha256(str(CACHE_VERSION).encode())
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(f'{a.dtype.str}{a.shape}'.encode())
+        h.update(a.data)
+    return h.hexdigest()
+
+
+def cache_path(key: str, suffix: str) -> str:
+    """Returns the path of a cache entry, creating the cache directory."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return path.join(CACHE_DIR, key + suffix)
+
+
+def load_frame(key: str) -> pd.DataFrame | None:
+    """Returns a cached data frame, or None if not cached."""
+    f = cache_path(key, '.npz')
+    if not path.exists(f):
+        return None
+    with np.load(f, allow_pickle=False) as npz:
+        return pd.DataFrame(
+            npz['values'],
+            index=pd.Index(npz['index'].tolist(), name='name'),
+            columns=npz['columns'].tolist(),
+        )
+
+
+def save_frame(key: str, df: pd.DataFrame):
+    """Caches a numeric data frame with string labels."""
+    f = cache_path(key, '.npz')
+    tmp = f + '.tmp.npz'
+    np.savez(
+        tmp,
+        values=df.values,
+        index=np.array(df.index.tolist(), dtype=str),
+        columns=np.array(df.columns.tolist(), dtype=str),
+    )
+    os.replace(tmp, f)
+
+
+def load_sparse(key: str) -> tuple[sparse.csr_array, list[str], list[str]] | None:
+    """Returns a cached sparse matrix with its row and column labels, or None
+    if not cached."""
+    f = cache_path(key, '.npz')
+    if not path.exists(f):
+        return None
+    with np.load(f, allow_pickle=False) as npz:
+        values = sparse.csr_array(
+            (npz['data'], npz['indices'], npz['indptr']),
+            shape=tuple(npz['shape']),
+        )
+        return values, npz['index'].tolist(), npz['columns'].tolist()
+
+
+def save_sparse(
+    key: str, values: sparse.csr_array, index: list[str], columns: list[str]
+):
+    """Caches a sparse matrix with string labels."""
+    f = cache_path(key, '.npz')
+    tmp = f + '.tmp.npz'
+    np.savez(
+        tmp,
+        data=values.data,
+        indices=values.indices,
+        indptr=values.indptr,
+        shape=np.array(values.shape),
+        index=np.array(index, dtype=str),
+        columns=np.array(columns, dtype=str),
+    )
+    os.replace(tmp, f)
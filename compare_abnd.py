@@ -5,14 +5,15 @@ import re
 import pandas as pd
 from matplotlib import pyplot as plt
 from myplot import ctx
-from scipy.spatial.distance import pdist, squareform
-from skbio.stats.distance import DistanceMatrix, permanova
+from scipy.spatial.distance import squareform
 from sklearn.decomposition import PCA
 from sklearn.manifold import MDS
 
 from abundance import AbundancePaths, load_data
 from confidence_ellipse import confidence_ellipse
 from config import WS_DATA_DIR
+from distance import braycurtis
+from permanova import permanova
 from samplenaming import LUNA_GROUPS
 
 GLOBAL_MODE = False
@@ -21,6 +22,10 @@ GLOBAL_MODE = False
 EXPORT_TO_R = False
 """If true, create CSVs for running permanova in R."""
 
+PERMANOVA_EARLY_STOP = None
+"""If set, stop permuting once the p-value is confidently above or below this
+significance level."""
+
 
 def enumerator():
     e = {}
@@ -36,19 +41,20 @@ def enumerator():
 def main():
     if GLOBAL_MODE:
         print('Running in GLOBAL MODE')
-        df = load_data(AbundancePaths.ALL_GEN, remove_spike=True)
+        df = load_data(AbundancePaths.ALL_GEN, remove_spike=True, sparse=True)
     else:
         df = load_data(AbundancePaths.BY_GENUS, remove_spike=True)
     # print(df)
+    idx = list(df.index)
 
-    d = squareform(pdist(df.values, 'braycurtis'))
+    d = squareform(braycurtis(df))
     print('Distances:', d.shape)
 
     pca = PCA(2).fit_transform(d)
     plt.style.use('bmh')
     with ctx('pca', sizeratio=1.5):
         for g in LUNA_GROUPS:
-            ii = [i for i, x in enumerate(df.index.tolist()) if x.startswith(g)]
+            ii = [i for i, x in enumerate(idx) if x.startswith(g)]
             if not ii:
                 raise Exception(f'group {g!r} not found')
             plt.scatter(pca[ii, 0], pca[ii, 1], label=LUNA_GROUPS[g])
@@ -61,7 +67,7 @@ def main():
     suffix = '-global' if GLOBAL_MODE else '-viral'
     with ctx(f'mds{suffix}', sizeratio=0.75, dpi=400):
         for g in ('1.Euro', '1.Inh', '2.Euro', '2.Inh'):
-            ii = [i for i, x in enumerate(df.index.tolist()) if x.startswith(g)]
+            ii = [i for i, x in enumerate(idx) if x.startswith(g)]
             if not ii:
                 raise Exception(f'group {g!r} not found')
             sc = plt.scatter(mds[ii, 0], mds[ii, 1], label=LUNA_GROUPS[g], alpha=0.5)
@@ -84,7 +90,7 @@ def main():
         prm_grouping = []
         prm_indexes = []
         enm = enumerator()
-        for i, x in enumerate(df.index.tolist()):
+        for i, x in enumerate(idx):
             m = grouper.findall(x)
             if not m:
                 continue
@@ -95,23 +101,17 @@ def main():
         # print(prm_indexes)
         # print(prm_grouping)
 
-        prm_d = d[prm_indexes][:, prm_indexes].copy()
+        prm_d = d[prm_indexes][:, prm_indexes]
         prmnv = permanova(
-            DistanceMatrix(prm_d),
+            prm_d,
             prm_grouping,
             permutations=100000,
+            early_stop=PERMANOVA_EARLY_STOP,
         )
         print('Permanova on', grouper.pattern, ':')
 
-        prmnv = prmnv.tolist()
-        n_samples = float(prmnv[2])
-        n_groups = float(prmnv[3])
-        f = float(prmnv[4])
-        pval = float(prmnv[5])
-
-        df1 = n_groups - 1
-        df2 = n_samples - n_groups
-        r2 = (f * df1) / (f * df1 + df2)
+        r2 = prmnv.r2()
+        pval = prmnv.pvalue
         print(f'{r2=:.2f} {pval=:.2g}')
 
     if EXPORT_TO_R:
@@ -120,8 +120,8 @@ def main():
             '\n'.join(','.join(str(x) for x in line) for line in d)
         )
         rgx = re.compile('^(\\d)\\.(Inh|Euro)_([^_]+)')
-        meta = [rgx.findall(x)[0] for x in df.index.tolist()]
-        meta = pd.DataFrame(meta, columns=['batch', 'part', 'loc'], index=df.index)
+        meta = [rgx.findall(x)[0] for x in idx]
+        meta = pd.DataFrame(meta, columns=['batch', 'part', 'loc'], index=idx)
         meta.to_csv(WS_DATA_DIR + '/prmnv_meta.csv', index=False)
 
 
@@ -10,4 +10,7 @@ DATA_DIR = _config['dataDir']
 WS_DATA_DIR = _config['wsDataDir']
 """Workspace data directory."""
 
+CACHE_DIR = _config.get('cacheDir', '.cache')
+"""Directory for cached intermediate results."""
+
 del _config
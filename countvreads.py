@@ -4,7 +4,14 @@ from matplotlib import pyplot as plt
 from myplot import ctx
 
 from abundance import AbundancePaths, load_data
-from samplenaming import LUNA_GROUPS, sample_group
+from groupstats import group_stats, group_values
+from samplenaming import LUNA_GROUPS, sample_table
+
+
+def print_group_stats(vir, groups):
+    for g, x in group_stats(vir, groups).iterrows():
+        if x['count']:
+            print('  {: <8} {:.2g}% +- {:.2g}%'.format(g, x['mean'], x['std']))
 
 
 def main():
@@ -12,21 +19,17 @@ def main():
     vir = (1 - df['Other'].values) * 100
     print('with spike: {:.2g}% +- {:.2g}%'.format(vir.mean(), vir.std()))
 
-    m_with_spike = {}
-    for g, gdf in df.groupby(sample_group):
-        vir = (1 - gdf['Other'].values) * 100
-        print('  {: <8} {:.2g}% +- {:.2g}%'.format(g, vir.mean(), vir.std()))
-        m_with_spike[g] = vir.tolist()
+    groups = sample_table(df.index.tolist()).group
+    print_group_stats(vir, groups)
+    m_with_spike = {g: x.tolist() for g, x in group_values(vir, groups).items()}
 
     df = load_data(AbundancePaths.VIR_OR, remove_spike='Other')
     vir = (1 - df['Other'].values) * 100
     print('without spike: {:.2g}% +- {:.2g}%'.format(vir.mean(), vir.std()))
 
-    m_no_spike = {}
-    for g, gdf in df.groupby(sample_group):
-        vir = (1 - gdf['Other'].values) * 100
-        print('  {: <8} {:.2g}% +- {:.2g}%'.format(g, vir.mean(), vir.std()))
-        m_no_spike[g] = vir.tolist()
+    groups = sample_table(df.index.tolist()).group
+    print_group_stats(vir, groups)
+    m_no_spike = {g: x.tolist() for g, x in group_values(vir, groups).items()}
 
     plt.style.use('bmh')
     size = [0.9, 0.3]
@@ -0,0 +1,114 @@
+"""Rank correlations between coverage tracks."""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from os import path
+
+import numpy as np
+from scipy.stats import kendalltau
+
+import covstore
+from cache import cache_key, cache_path, file_stats
+
+
+def nonzero_union(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Returns a mask of positions where a or b is nonzero."""
+    return (np.asarray(a) != 0) | (np.asarray(b) != 0)
+
+
+def tau(a: np.ndarray, b: np.ndarray, bins: int = None) -> float | None:
+    """Returns Kendall's tau between two tracks, over the positions where
+    either is nonzero. Returns None if either track is missing.
+
+    scipy's kendalltau runs in O(n log n). If bins is given, longer tracks are
+    first summed into that many consecutive bins.
+    """
+    if a is None or b is None:
+        return None
+    nz = nonzero_union(a, b)
+    a, b = a[nz], b[nz]
+    if bins and len(a) > bins:
+        starts = np.linspace(0, len(a), bins + 1).astype(int)[:-1]
+        a = np.add.reduceat(a, starts, dtype=np.int64)
+        b = np.add.reduceat(b, starts, dtype=np.int64)
+    return kendalltau(a, b).statistic
+
+
+def species_taus(
+    covs: dict[str, np.ndarray], bins: int = None
+) -> tuple[float | None, float | None, float | None]:
+    """Returns the taus of v1 solid vs. influent, v2 solid vs. influent and
+    v1 vs. v2 for one species."""
+    return (
+        tau(covs['1.Inh'], covs['1.Euro'], bins),
+        tau(covs['2.Inh'], covs['2.Euro'], bins),
+        tau(
+            _sum(covs['1.Inh'], covs['1.Euro']),
+            _sum(covs['2.Inh'], covs['2.Euro']),
+            bins,
+        ),
+    )
+
+
+def all_species_taus(
+    files: list[str], bins: int = None, workers=None, use_cache=True
+) -> list[tuple[float | None, float | None, float | None]]:
+    """Returns species_taus for each coverage JSON file, computed in a
+    process pool. Each worker reads its species from the coverage store.
+
+    Taus are cached by file modification time and size, so only new or
+    changed files are computed.
+    """
+    keys = [cache_key('taus', file_stats([f]), bins) for f in files]
+    cached = _load_taus() if use_cache else {}
+    missing = [i for i, k in enumerate(keys) if k not in cached]
+    print(len(files) - len(missing), 'of', len(files), 'taus cached')
+    if missing:
+        with ProcessPoolExecutor(workers) as pool:
+            taus = pool.map(
+                _file_taus, [files[i] for i in missing], [bins] * len(missing)
+            )
+            computed = {keys[i]: t for i, t in zip(missing, taus)}
+        cached.update(computed)
+        if use_cache:
+            _update_taus(computed)
+    return [tuple(cached[k]) for k in keys]
+
+
+def _file_taus(f: str, bins: int):
+    return species_taus(covstore.load(f), bins)
+
+
+def _taus_path() -> str:
+    return cache_path('taus', '.json')
+
+
+def _load_taus() -> dict[str, list]:
+    f = _taus_path()
+    if not path.exists(f):
+        return {}
+    with open(f) as inp:
+        return json.load(inp)
+
+
+def _update_taus(entries: dict[str, tuple]):
+    taus = _load_taus()
+    taus.update(entries)
+    f = _taus_path()
+    with open(f + '.tmp', 'w') as out:
+        json.dump(taus, out)
+    os.replace(f + '.tmp', f)
+
+
+def _sum(*tracks: np.ndarray) -> np.ndarray | None:
+    """Returns the sum of the non-missing tracks, or None if all are missing."""
+    s = None
+    for x in tracks:
+        if x is None:
+            continue
+        if s is None:
+            s = np.array(x, dtype=np.int64)
+        else:
+            s += x
+    return s
@@ -10,16 +10,24 @@ from typing import Iterable
 
 import numpy as np
 from matplotlib import pyplot as plt
-from myplot import ctx
-from pympler.asizeof import asizeof
-from scipy.stats import kendalltau
 
+import covstore
+from binning import plot_track
 from config import WS_DATA_DIR
+from covcorr import all_species_taus
+from render import Job, render, render_all
 from samplenaming import LUNA_GROUPS
 
 WITH_TAU = True
 WITH_COVERAGE = True
 WITH_LOG_Y = False
+TAU_BINS = None
+"""If set, coverage is summed into this many bins before calculating tau."""
+SPECIES_DPI = 300
+"""Resolution of the species plots, also used to bin their tracks."""
+RENDER_WORKERS = None
+RENDER_MEMORY_LIMIT = None
+"""If set, maximal bytes of memory for each rendering process."""
 
 SAMPLES_FILE = 'samples.txt'
 KRK_FILE = f'{WS_DATA_DIR}/krk_viral.json'
@@ -33,17 +41,6 @@ COV_ANNOT = {
 }
 
 
-def load_data(glb: str) -> Iterable[tuple[str, dict[str, np.ndarray]]]:
-    """Yields pairs of (species, counts by group)."""
-    return (
-        (
-            extract_species(f),
-            json.load(open(f), object_hook=json_hook),
-        )
-        for f in glob(glb)
-    )
-
-
 def load_data_nz(glb: str) -> Iterable[tuple[str, dict[str, float]]]:
     """Yields pairs of (species, nonzero map)."""
     return (
@@ -55,13 +52,6 @@ def load_data_nz(glb: str) -> Iterable[tuple[str, dict[str, float]]]:
     )
 
 
-def json_hook(d: dict):
-    for k in d:
-        if d[k]:
-            d[k] = np.array(d[k])
-    return d
-
-
 def extract_species(f: str) -> str:
     return (
         path.basename(f)
@@ -72,48 +62,18 @@ def extract_species(f: str) -> str:
     )
 
 
-def sum_covs(covs: Iterable[np.ndarray]) -> np.ndarray:
-    s = mysum(covs)
-    if s is None:
-        return None
-    return s  # / s.max()
-
-
-def mysum(a):
-    s = None
-    for x in a:
-        if x is None:
-            continue
-        if s is None:
-            s = x
-        else:
-            s += x
-    return s
-
-
-def sum_species(d: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
-    dd = {}
-    for g in LUNA_GROUPS:
-        dd[g] = sum_covs((v for k, v in d.items() if k.startswith(g)))
-    return dd
-
-
-def plot_species(d: dict[str, list[float]]):
+def plot_species(d: dict[str, np.ndarray], dpi: float = None):
     ax1 = plt.gca()
     ax2 = plt.twinx()
     for g, gg in LUNA_GROUPS.items():
         yy = d[g]
         if yy is None:
             yy = []
-        try:
-            xx = list(range(len(yy)))
-        except TypeError:
-            raise TypeError(f'cannot len type {type(yy)}')
         if g.startswith('1'):
-            ax1.plot(xx, yy, label=gg, alpha=0.5, linewidth=0.75)
+            plot_track(yy, ax1, dpi, label=gg, alpha=0.5, linewidth=0.75)
             ax2.plot([], [], label=gg, alpha=0.5, linewidth=0.75)
         if g.startswith('2'):
-            ax2.plot(xx, yy, label=gg, alpha=0.5, linewidth=0.75)
+            plot_track(yy, ax2, dpi, label=gg, alpha=0.5, linewidth=0.75)
             ax1.plot([], [], label=gg, alpha=0.5, linewidth=0.75)
     ax1.set_ylabel('VSP v1')
     ax2.set_ylabel('VSP v2')
@@ -123,20 +83,48 @@ def plot_species(d: dict[str, list[float]]):
     # plt.legend()
 
 
+def plot_species_file(f: str, title: str, dpi: float):
+    """Plots a species coverage file. Runs in a render worker. dpi should
+    match the figure's, for binning."""
+    kdata = covstore.load(f)
+    size = sum(v.nbytes for v in kdata.values() if v is not None)
+    print(f'Size: {size/(2**20):.1f}mb')
+    plot_species(kdata, dpi=dpi)
+    plt.title(title)
+
+
+def legend_handles() -> tuple[list, list[str]]:
+    """Returns the legend handles and labels of the species plots."""
+    fig = plt.figure()
+    plot_species({g: None for g in LUNA_GROUPS})
+    legend = plt.gca().get_legend_handles_labels()
+    plt.close(fig)
+    return legend
+
+
+def legend_figure():
+    lgnd = plt.legend(*legend_handles(), loc='center')
+    for line in lgnd.get_lines():
+        line.set_linewidth(3.0)
+    plt.gca().axis('off')
+
+
+def tau_figure(tdata: dict[str, list[float]]):
+    violin(tdata)
+    plt.ylabel('Kendall\'s tau')
+
+
+def prc_figure(pp: dict[str, list[float]]):
+    violin(pp)
+    plt.ylabel('Percent coverage')
+    plt.xticks(rotation=20)
+
+
 def load_names() -> dict[str, str]:
     raw = json.load(open(KRK_FILE))
     return {x: raw[x]['Name'] for x in raw}
 
 
-def tau_wrapper(a, b):
-    if a is None or b is None:
-        return None
-    nz = [i for i in range(len(a)) if a[i] != 0 or b[i] != 0]
-    a = a[nz]  # [a[i] for i in nz]
-    b = b[nz]  # [b[i] for i in nz]
-    return kendalltau(a, b).statistic  # mytau.tauf(a, b)
-
-
 def violin(d: dict[str, list], rotate_xticks=None):
     plt.violinplot(list(d.values()), showmedians=True, showextrema=True)
     plt.xticks(list(range(1, len(d) + 1)), d.keys())
@@ -162,45 +150,43 @@ def main():
     in_glob_nz = path.join(in_dir, '*.nz.json')
     names = load_names()
 
+    files = glob(in_glob)
+    if WITH_TAU:
+        print('Calculating taus')
+        taus = all_species_taus(files, TAU_BINS)
+    else:
+        taus = [(None, None, None)] * len(files)
+
     t1s, t2s, t12s = [], [], []
-    legend = None
-    for key, kdata in load_data(in_glob):
-        with ctx(f'cov-{key}', dpi=300, sizeratio=0.66):
-            print(f'Size: {asizeof(kdata)/(2**20):.1f}mb')
-            plot_species(kdata)
-            if not legend:
-                legend = plt.gca().get_legend_handles_labels()
-
-            t1, t2, t12 = None, None, None
-            if WITH_TAU:
-                t1 = tau_wrapper(kdata['1.Inh'], kdata['1.Euro'])
-                t2 = tau_wrapper(kdata['2.Inh'], kdata['2.Euro'])
-                t12 = tau_wrapper(
-                    sum_covs([kdata['1.Inh'], kdata['1.Euro']]),
-                    sum_covs([kdata['2.Inh'], kdata['2.Euro']]),
-                )
-            if t1:
-                t1s.append(t1)
-            if t2:
-                t2s.append(t2)
-            if t12:
-                t12s.append(t12)
-
-            suf = COV_ANNOT[(key in COV_SPECIES['top'], key in COV_SPECIES['vsp2'])]
-            tsuf1 = f' $\\tau_1$={t1:.2f}' if t1 else ''
-            tsuf2 = f' $\\tau_2$={t2:.2f}' if t2 else ''
-            tsuf12 = f' $\\tau_{{12}}$={t12:.2f}' if t12 else ''
-            tsuf = (tsuf1 + tsuf2 + tsuf12).strip()
-            if tsuf:
-                tsuf = '\n' + tsuf
-            plt.title(title.format(name=names.get(key, key)) + suf + tsuf)
-
-    with ctx('cov-legend', dpi=400):
-        lgnd = plt.legend(*legend, loc='center')
-        for line in lgnd.get_lines():
-            line.set_linewidth(3.0)
-        plt.gca().axis('off')
-    del legend, lgnd
+    jobs = []
+    for f, (t1, t2, t12) in zip(files, taus):
+        key = extract_species(f)
+        if t1:
+            t1s.append(t1)
+        if t2:
+            t2s.append(t2)
+        if t12:
+            t12s.append(t12)
+
+        suf = COV_ANNOT[(key in COV_SPECIES['top'], key in COV_SPECIES['vsp2'])]
+        tsuf1 = f' $\\tau_1$={t1:.2f}' if t1 else ''
+        tsuf2 = f' $\\tau_2$={t2:.2f}' if t2 else ''
+        tsuf12 = f' $\\tau_{{12}}$={t12:.2f}' if t12 else ''
+        tsuf = (tsuf1 + tsuf2 + tsuf12).strip()
+        if tsuf:
+            tsuf = '\n' + tsuf
+        jobs.append(
+            Job(
+                f'cov-{key}',
+                plot_species_file,
+                (f, title.format(name=names.get(key, key)) + suf + tsuf, SPECIES_DPI),
+                {'dpi': SPECIES_DPI, 'sizeratio': 0.66},
+            )
+        )
+    print('Rendering', len(jobs), 'species')
+    render_all(jobs, RENDER_WORKERS, RENDER_MEMORY_LIMIT)
+
+    render('cov-legend', legend_figure, dpi=400)
 
     # plt.style.use('bmh')
 
@@ -210,14 +196,13 @@ def main():
                 np.median(t1s), np.median(t2s), np.median(t12s)
             )
         )
-        with ctx('cov-tau', dpi=500, sizeratio=[0.5, 0.5]):
-            tdata = {
-                'VSP v1\nsolid vs.\ninfluent': t1s,
-                'VSP v2\nsolid vs.\ninfluent': t2s,
-                'VSP v1\nvs. v2': t12s,
-            }
-            violin({k: tdata[k] for k in tdata if tdata[k]})
-            plt.ylabel('Kendall\'s tau')
+        tdata = {
+            'VSP v1\nsolid vs.\ninfluent': t1s,
+            'VSP v2\nsolid vs.\ninfluent': t2s,
+            'VSP v1\nvs. v2': t12s,
+        }
+        tdata = {k: tdata[k] for k in tdata if tdata[k]}
+        render('cov-tau', tau_figure, tdata, dpi=500, sizeratio=[0.5, 0.5])
 
     if WITH_COVERAGE:
         pp = defaultdict(list)
@@ -227,10 +212,7 @@ def main():
                 g = group_re.findall(smpl)[0]
                 pp[g].append(p)
         pp = {LUNA_GROUPS[x]: pp[x] for x in sorted(pp)}  # Sort keys
-        with ctx('cov-prc', dpi=500, sizeratio=0.5):
-            violin(pp)
-            plt.ylabel('Percent coverage')
-            plt.xticks(rotation=20)
+        render('cov-prc', prc_figure, pp, dpi=500, sizeratio=0.5)
 
 
 if __name__ == '__main__':
@@ -2,41 +2,75 @@
 
 import json
 import sys
-from array import array
+from concurrent.futures import ProcessPoolExecutor
 from glob import glob
+from os import cpu_count
 
 import numpy as np
 from matplotlib import pyplot as plt
 from myplot import ctx
 
+from binning import plot_track
 
-def load_data(dir: str):
+
+def load_data(dir: str, workers=None) -> dict[str, np.ndarray]:
+    """Returns summed coverage vectors by reference.
+
+    Files are split between worker processes, each summing its share one file
+    at a time. The partial sums are then merged pairwise.
+    """
     files = glob(dir + '/*.cov.json')
     print(len(files), 'files')
 
+    workers = min(workers or cpu_count(), len(files)) or 1
+    chunks = [files[i::workers] for i in range(workers)]
+    with ProcessPoolExecutor(workers) as pool:
+        parts = list(pool.map(sum_files, chunks))
+
+    while len(parts) > 1:
+        merged = [merge(a, b) for a, b in zip(parts[::2], parts[1::2])]
+        if len(parts) % 2:
+            merged.append(parts[-1])
+        parts = merged
+    return parts[0]
+
+
+def sum_files(files: list[str]) -> dict[str, np.ndarray]:
     d = {}
     for f in files:
-        j = json.load(open(f))
+        with open(f) as fp:
+            j: dict[str, list[int]] = json.load(fp)
         for k, v in j.items():
-            if k not in d:
-                d[k] = array('Q', v)
-                continue
-            dk = d[k]
-            if len(dk) < len(v):
-                dif = len(v) - len(dk)
-                dk.extend([0] * dif)
-            for i, x in enumerate(v):
-                dk[i] += x
-
+            add(d, k, np.array(v, dtype=np.uint64))
+        del j
     return d
 
 
+def merge(a: dict[str, np.ndarray], b: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """Adds b's vectors to a's and returns a."""
+    for k, v in b.items():
+        add(a, k, v)
+    return a
+
+
+def add(d: dict[str, np.ndarray], k: str, v: np.ndarray):
+    """Adds v to d[k], growing d[k] to v's length if it is shorter."""
+    dk = d.get(k)
+    if dk is None:
+        d[k] = v
+    elif len(dk) >= len(v):
+        dk[: len(v)] += v
+    else:
+        v[: len(dk)] += dk
+        d[k] = v
+
+
 def main():
     data = load_data(sys.argv[1])
     print([(k, len(v)) for k, v in data.items()])
     for k, v in data.items():
         with ctx(k):
-            plt.plot(np.arange(len(v)), v)
+            plot_track(v)
             plt.title(k)
 
 
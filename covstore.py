@@ -0,0 +1,74 @@
+"""Binary storage for per-species coverage vectors.
+
+Each coverage JSON file (a map from key to coverage list or null) is stored
+next to it as a single int32 binary file, plus an index with the offset and
+length of each key's vector. Loading memory-maps the binary file, so only the
+touched pages are read.
+"""
+
+import json
+import os
+from os import path
+
+import numpy as np
+
+DTYPE = np.int32
+
+
+def store_paths(json_file: str) -> tuple[str, str]:
+    """Returns the binary and index paths for a coverage JSON file."""
+    base = json_file.removesuffix('.json')
+    return base + '.bin', base + '.idx.json'
+
+
+def is_current(json_file: str) -> bool:
+    """Returns whether the binary store exists and is newer than the JSON."""
+    bin_file, idx_file = store_paths(json_file)
+    if not path.exists(bin_file) or not path.exists(idx_file):
+        return False
+    mtime = path.getmtime(json_file)
+    return path.getmtime(bin_file) >= mtime and path.getmtime(idx_file) >= mtime
+
+
+def convert(json_file: str):
+    """Converts a coverage JSON file to the binary store."""
+    with open(json_file) as f:
+        data: dict[str, list[int] | None] = json.load(f)
+    bin_file, idx_file = store_paths(json_file)
+
+    index = {}
+    offset = 0
+    with open(bin_file + '.tmp', 'wb') as f:
+        for k, v in data.items():
+            if not v:
+                index[k] = None
+                continue
+            a = np.array(v)
+            if a.dtype.kind not in 'iu':
+                raise ValueError(f'{json_file}: {k}: non-integer coverage')
+            if a.max() > np.iinfo(DTYPE).max:
+                raise ValueError(f'{json_file}: {k}: coverage overflows {DTYPE}')
+            a.astype(DTYPE).tofile(f)
+            index[k] = [offset, len(a)]
+            offset += len(a)
+    with open(idx_file + '.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(bin_file + '.tmp', bin_file)
+    os.replace(idx_file + '.tmp', idx_file)
+
+
+def load(json_file: str) -> dict[str, np.ndarray | None]:
+    """Returns read-only memory-mapped coverage vectors by key, converting the
+    JSON file first if its binary store is missing or outdated."""
+    if not is_current(json_file):
+        convert(json_file)
+    bin_file, idx_file = store_paths(json_file)
+    with open(idx_file) as f:
+        index: dict[str, list[int] | None] = json.load(f)
+    if path.getsize(bin_file) == 0:  # Cannot memory-map an empty file.
+        data = np.zeros(0, dtype=DTYPE)
+    else:
+        data = np.memmap(bin_file, dtype=DTYPE, mode='r')
+    return {
+        k: None if v is None else data[v[0] : v[0] + v[1]] for k, v in index.items()
+    }
@@ -0,0 +1,95 @@
+"""Distance calculations between samples."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse as sp
+
+from abundance import SparseAbundance
+from cache import array_key, cache_path
+
+BLOCK_ELEMENTS = 2**24
+"""Maximal number of elements in an intermediate block matrix."""
+
+
+def braycurtis(
+    x: pd.DataFrame | SparseAbundance | np.ndarray | sp.sparray,
+    dtype=np.float64,
+    workers=None,
+    use_cache=True,
+) -> np.ndarray:
+    """Returns condensed Bray-Curtis distances between the rows of x,
+    in the format of scipy's pdist.
+
+    Rows are processed in blocks across a thread pool. The result is
+    memory-mapped from the cache directory and reused when called again on a
+    matrix with the same values.
+    """
+    x = _to_csr(x)
+    n = x.shape[0]
+    size = n * (n - 1) // 2
+    dtype = np.dtype(dtype)
+
+    if not use_cache:
+        out = np.empty(size, dtype=dtype)
+        _braycurtis_into(x, out, workers)
+        return out
+
+    key = array_key(x.data, x.indices, x.indptr, np.array(x.shape))
+    f = cache_path(key, f'.{dtype.name}.dist')
+    if not path.exists(f):
+        tmp = f + '.tmp'
+        out = np.memmap(tmp, dtype=dtype, mode='w+', shape=(size,))
+        _braycurtis_into(x, out, workers)
+        out.flush()
+        del out
+        os.replace(tmp, f)
+    return np.memmap(f, dtype=dtype, mode='r', shape=(size,))
+
+
+def _to_csr(x) -> sp.csr_array:
+    if isinstance(x, SparseAbundance):
+        x = x.values
+    elif isinstance(x, pd.DataFrame):
+        x = x.values
+    x = sp.csr_array(x, dtype=np.float64)
+    x.sum_duplicates()
+    x.sort_indices()
+    return x
+
+
+def _braycurtis_into(x: sp.csr_array, out: np.ndarray, workers):
+    n = x.shape[0]
+    if n < 2:
+        return
+    sums = x.sum(axis=1)
+    step = max(1, BLOCK_ELEMENTS // max(x.nnz, x.shape[1], 1))
+
+    def run(start: int):
+        end = min(start + step, n - 1)
+        mins = _sum_of_mins(x[start:end].toarray(), x[start + 1 :])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for i in range(start, end):
+                j = i - start
+                d = 1 - 2 * mins[j, j:] / (sums[i] + sums[i + 1 :])
+                first = n * i - i * (i + 1) // 2
+                out[first : first + n - i - 1] = d
+
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(run, range(0, n - 1, step)))
+
+
+def _sum_of_mins(a: np.ndarray, b: sp.csr_array) -> np.ndarray:
+    """Returns the sums of element-wise minima between each row of a and each
+    row of b. Assumes non-negative values."""
+    result = np.zeros((a.shape[0], b.shape[0]))
+    nonempty = np.diff(b.indptr) > 0
+    if not nonempty.any():
+        return result
+    # Zeros in b contribute nothing, so only b's nonzero entries are compared.
+    mins = np.minimum(a[:, b.indices], b.data)
+    result[:, nonempty] = np.add.reduceat(mins, b.indptr[:-1][nonempty], axis=1)
+    return result
@@ -6,12 +6,14 @@ import sys
 
 import numpy as np
 from matplotlib import pyplot as plt
-from myplot import ctx
-from scipy.stats import entropy
 
 from abundance import AbundancePaths, load_data
+from alphadiv import richness, shannon
 from config import WS_DATA_DIR
-from samplenaming import LUNA_GROUPS, fix_name
+from groupstats import group_stats, group_values
+from render import render
+from samplenaming import LUNA_GROUPS, fix_name, sample_table
+from taxonomy import KRK_STD2_FILE, Taxonomy
 
 PRINT_FOUND_VSP2_SPECIES = False
 
@@ -25,20 +27,13 @@ def load_vsp2_taxids() -> dict[str, str]:
 
 
 def load_phyla() -> dict[str, str]:
-    krk = json.load(open(f'{WS_DATA_DIR}/krk_std2.json'))
-    phyla = {}
-    for tid, data in krk.items():
-        if not data['Level'].startswith('S'):
-            continue
-        ptid = tid
-        while krk[ptid]['Level'] != 'P':
-            if krk[ptid]['Level'] == 'R':
-                break
-            ptid = krk[ptid]['ParentTID']
-        else:
-            assert krk[ptid]['Level'] == 'P'
-            phyla[tid] = krk[ptid]['Name']
-    return phyla
+    tax = Taxonomy.load(KRK_STD2_FILE)
+    species = np.flatnonzero(tax.level_mask('S'))
+    phyla = tax.ancestor_at(species, 'P')
+    found = phyla >= 0
+    return dict(
+        zip(tax.tids[species[found]].tolist(), tax.names[phyla[found]].tolist())
+    )
 
 
 def load_vsp2_phyla() -> dict[str, str]:
@@ -47,17 +42,42 @@ def load_vsp2_phyla() -> dict[str, str]:
     return {name: phyla[tid] for tid, name in tids.items() if tid in phyla}
 
 
+def group_dots(gvalues: list, labels: list[str], xlabel: str, box=True):
+    """Plots a row of dots per group, over a box plot if box is true."""
+    if box:
+        plt.boxplot(gvalues, showfliers=False, whis=0, vert=False, widths=0.75)
+    for i, g in enumerate(gvalues):
+        plt.plot(g, [i + 1] * len(g), 'o', alpha=0.5)
+    plt.yticks(list(range(1, len(labels) + 1)), labels)
+    plt.xlabel(xlabel)
+    plt.gca().invert_yaxis()
+
+
+def group_scatter(
+    gx: list, gy: list, labels: list[str], ylabel: str, title: str, log_y: bool
+):
+    """Plots number of reads against a per-sample value, colored by group."""
+    for i in range(len(labels)):
+        plt.plot(gx[i], gy[i], 'o', alpha=0.5, label=labels[i])
+    plt.legend()
+    plt.xlabel('Number of reads')
+    plt.ylabel(ylabel)
+    plt.title(title)
+    plt.xscale('log')
+    if log_y:
+        plt.yscale('log')
+
+
 def main():
     assert len(sys.argv) == 2, 'Usage: diversity.py remove_spike?(0/1)'
     rmspike = {'0': False, '1': True}[sys.argv[1]]
     print(f'{rmspike=}')
     df = load_data(AbundancePaths.BY_TID, remove_spike=rmspike)
     idx: list[str] = df.index.tolist()
+    samples = sample_table(idx)
 
-    ents = [entropy(x) for x in df.values]
-    nz = [sum(x > 0) for x in df.values]
-    assert len(ents) == len(df)
-    assert len(nz) == len(df)
+    ents = shannon(df)
+    nz = richness(df)
 
     nreads: dict[str, int] = {}
     for x in csv.DictReader(open('samples-ww.csv')):
@@ -93,72 +113,67 @@ def main():
     # print(ratio.mean(), ratio.std())
     # return
 
-    groups = list(LUNA_GROUPS)
     labels = list(LUNA_GROUPS.values())
-    # groups = ('',)
 
-    greads = []
-    gents = []
-    gspecies = []
-    for g in groups:
-        greads.append([nreads[k] for k in idx if k.startswith(g)])
-        gents.append([v for k, v in zip(idx, ents) if k.startswith(g)])
-        gspecies.append([v for k, v in zip(idx, nz) if k.startswith(g)])
+    greads = list(group_values([nreads[k] for k in idx], samples.group).values())
+    gents = list(group_values(ents, samples.group).values())
+    gspecies = list(group_values(nz, samples.group).values())
 
     print('Species counts:')
-    for g, x in zip(groups, gspecies):
+    for g, x in group_stats(nz, samples.group).iterrows():
         print(
-            f'- {g} ({min(x)}-{max(x)}) '
-            f'Avg={np.mean(x):.1f}+-{np.std(x):.1f} '
-            f'Med={np.median(x)}'
+            f'- {g} ({x["min"]:.0f}-{x["max"]:.0f}) '
+            f'Avg={x["mean"]:.1f}+-{x["std"]:.1f} '
+            f'Med={x["median"]}'
         )
 
     plt.style.use('bmh')
 
     size = [0.9, 0.3]
     dpi = 600
-    with ctx('reads', dpi=dpi, sizeratio=size):
-        plt.boxplot(greads, showfliers=False, whis=0, vert=False, widths=0.75)
-        for i, g in enumerate(greads):
-            plt.plot(g, [i + 1] * len(g), 'o', alpha=0.5)
-        plt.yticks(list(range(1, len(groups) + 1)), labels)
-        plt.xlabel('Reads per sample')
-        plt.gca().invert_yaxis()
-
-    with ctx('ents', dpi=dpi, sizeratio=size):
-        plt.boxplot(gents, showfliers=False, whis=0, vert=False, widths=0.75)
-        for i, g in enumerate(gents):
-            plt.plot(g, [i + 1] * len(g), 'o', alpha=0.5)
-        plt.yticks(list(range(1, len(groups) + 1)), labels)
-        plt.xlabel('Viral Shannon-diversity per sample')
-        plt.gca().invert_yaxis()
-
-    with ctx('species', dpi=dpi, sizeratio=size):
-        plt.boxplot(gspecies, showfliers=False, whis=0, vert=False, widths=0.75)
-        for i, g in enumerate(gspecies):
-            plt.plot(g, [i + 1] * len(g), 'o', alpha=0.5)
-        plt.yticks(list(range(1, len(groups) + 1)), labels)
-        plt.xlabel('Species per sample')
-        plt.gca().invert_yaxis()
-
-    with ctx('reads-species', sizeratio=0.75):
-        for i in range(len(groups)):
-            plt.plot(greads[i], gspecies[i], 'o', alpha=0.5, label=labels[i])
-        plt.legend()
-        plt.xlabel('Number of reads')
-        plt.ylabel('Number of species')
-        plt.title('Reads vs Species')
-        plt.xscale('log')
-        plt.yscale('log')
-
-    with ctx('reads-ents', sizeratio=0.75):
-        for i in range(len(groups)):
-            plt.plot(greads[i], gents[i], 'o', alpha=0.5, label=labels[i])
-        plt.legend()
-        plt.xlabel('Number of reads')
-        plt.ylabel('Shannon diversity')
-        plt.title('Reads vs Diversity')
-        plt.xscale('log')
+    render(
+        'reads', group_dots, greads, labels, 'Reads per sample', dpi=dpi, sizeratio=size
+    )
+    render(
+        'ents',
+        group_dots,
+        gents,
+        labels,
+        'Viral Shannon-diversity per sample',
+        dpi=dpi,
+        sizeratio=size,
+    )
+    render(
+        'species',
+        group_dots,
+        gspecies,
+        labels,
+        'Species per sample',
+        dpi=dpi,
+        sizeratio=size,
+    )
+    render(
+        'reads-species',
+        group_scatter,
+        greads,
+        gspecies,
+        labels,
+        'Number of species',
+        'Reads vs Species',
+        True,
+        sizeratio=0.75,
+    )
+    render(
+        'reads-ents',
+        group_scatter,
+        greads,
+        gents,
+        labels,
+        'Shannon diversity',
+        'Reads vs Diversity',
+        False,
+        sizeratio=0.75,
+    )
 
     # top_species = df.columns.tolist()[:10]
     vsp2 = load_vsp2_taxids()
@@ -193,22 +208,20 @@ def main():
         f'+- {vsp2_totals[18:].std():.2f}'
     )
 
-    nz = [sum(x > 0) for x in df.values]
-    assert len(nz) == len(df)
-    gspecies = []
-    for g in groups:
-        gspecies.append([v for k, v in zip(idx, nz) if k.startswith(g)])
-
-    with ctx('species-vsp2', dpi=dpi, sizeratio=size):
-        # plt.boxplot(gspecies, showfliers=False, whis=0, vert=False, widths=0.75)
-        for i, g in enumerate(gspecies):
-            plt.plot(g, [i + 1] * len(g), 'o', alpha=0.5)
-        plt.yticks(list(range(1, len(groups) + 1)), labels)
-        plt.xlabel(
-            'VSP v2 enriched viruses per sample'
-            + (' (without spike)' if rmspike else ' (with spike)')
-        )
-        plt.gca().invert_yaxis()
+    nz = richness(df)
+    gspecies = list(group_values(nz, samples.group).values())
+
+    render(
+        'species-vsp2',
+        group_dots,
+        gspecies,
+        labels,
+        'VSP v2 enriched viruses per sample'
+        + (' (without spike)' if rmspike else ' (with spike)'),
+        False,
+        dpi=dpi,
+        sizeratio=size,
+    )
 
     if PRINT_FOUND_VSP2_SPECIES:
         mol_types = json.load(open(PHYLUM_TO_MOLTYPE_FILE))
@@ -4,7 +4,7 @@ import numpy as np
 from matplotlib import pyplot as plt
 from myplot import ctx
 
-from abundance import AbundancePaths, load_data, sort_columns
+from abundance import AbundancePaths, load_data, sort_columns, sum_columns
 from config import WS_DATA_DIR
 from samplenaming import LUNA_GROUPS, fix_name2
 
@@ -12,13 +12,12 @@ PHYLUM_TO_MOLTYPE_FILE = f'{WS_DATA_DIR}/vir_phylum_moltype.json'
 
 
 def main():
-    df = load_data(AbundancePaths.BY_PHY, remove_spike=True, phylum_mode=True)
+    df = load_data(AbundancePaths.BY_TID, remove_spike=True, level='P')
     idx = df.index.tolist()
     cols = df.columns.tolist()
 
     mol_types = json.load(open(PHYLUM_TO_MOLTYPE_FILE))
-    df.columns = [mol_types.get(c, 'Unknown') for c in cols]
-    df = df.groupby(df.columns, axis=1).sum()
+    df = sum_columns(df, [mol_types.get(c, 'Unknown') for c in cols])
     df = sort_columns(df)
 
     # plt.style.use('bmh')
@@ -9,12 +9,13 @@ from matplotlib import pyplot as plt
 from myplot import ctx
 
 from abundance import AbundancePaths, load_data
-from config import DATA_DIR, WS_DATA_DIR
+from config import DATA_DIR
 from samplenaming import fix_name2, sample_group
+from taxonomy import KRK_STD2_FILE, Taxonomy
 
 V1_FILES = f'{DATA_DIR}/ww-dragen/v1/*.json'
 V2_FILES = f'{DATA_DIR}/ww-dragen/v2/*.json'
-KRK_FILE = f'{WS_DATA_DIR}/krk_std2.json'
+KRK_FILE = KRK_STD2_FILE
 MIN_ABUNDANCE = 0.00001
 
 VSP_V1 = True
@@ -43,24 +44,12 @@ def remove_spike(d: dict) -> dict:
     return d
 
 
-def load_phage_genera() -> dict:
-    d: dict = json.load(open(KRK_FILE))
-    phages = []
-    for k, v in d.items():
-        if v['Level'][0] not in {'S', 'G'}:
-            continue
-        if 'phage' not in v['Name'].lower():
-            continue
-        phages.append(k)
-    genera = set()
-    for p in phages:
-        while d[p]['Level'] != 'G':
-            if d[p]['Level'][0] not in {'S', 'G'}:
-                break
-            p = d[p]['ParentTID']
-        else:
-            genera.add(d[p]['Name'])
-    return genera
+def load_phage_genera() -> set[str]:
+    tax = Taxonomy.load(KRK_FILE)
+    is_phage = np.char.find(np.char.lower(tax.names), 'phage') >= 0
+    phages = np.flatnonzero(tax.level_mask('S', 'G') & is_phage)
+    genera = tax.ancestor_at(phages, 'G', via=('S', 'G'))
+    return set(tax.names[genera[genera >= 0]].tolist())
 
 
 def main():
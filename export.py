@@ -3,9 +3,10 @@
 import re
 
 import pandas as pd
-from scipy.spatial.distance import pdist, squareform
+from scipy.spatial.distance import squareform
 
 from abundance import AbundancePaths, load_data
+from distance import braycurtis
 
 
 def export():
@@ -15,7 +16,7 @@ def export():
 
 def export_permanova():
     df = load_data(AbundancePaths.BY_TID, remove_spike=True)
-    d = pd.DataFrame(squareform(pdist(df.values, 'braycurtis')))
+    d = pd.DataFrame(squareform(braycurtis(df)))
     print(d.shape)
     # print(d)
     d.to_csv('dist.csv', index=False, header=False)
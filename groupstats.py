@@ -0,0 +1,64 @@
+"""Per-group reductions of per-sample values."""
+
+import numpy as np
+import pandas as pd
+
+
+def group_values(values, groups) -> dict[str, np.ndarray]:
+    """Splits values by group with one stable sort.
+
+    Groups are ordered by their categories if categorical, or sorted
+    otherwise. Values with a missing group are dropped.
+    """
+    codes, cats = _codes(groups)
+    values = np.asarray(values)
+    order = np.argsort(codes, kind='stable')
+    order = order[codes[order] >= 0]
+    counts = np.bincount(codes[order], minlength=len(cats))
+    return dict(zip(cats, np.split(values[order], np.cumsum(counts)[:-1])))
+
+
+def group_stats(values, groups) -> pd.DataFrame:
+    """Returns count, mean, std, median, min and max of values per group.
+
+    Values are sorted once by group and value, and all statistics are read
+    off the sorted array. std is the population standard deviation, like
+    np.std.
+    """
+    codes, cats = _codes(groups)
+    values = np.asarray(values, dtype=float)
+    keep = codes >= 0
+    codes, values = codes[keep], values[keep]
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order]
+
+    k = len(cats)
+    count = np.bincount(codes, minlength=k)
+    ends = np.cumsum(count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.bincount(codes, weights=values, minlength=k) / count
+        dev = values - mean[codes]
+        std = np.sqrt(np.bincount(codes, weights=dev**2, minlength=k) / count)
+
+    # Empty groups point past the end, at a NaN.
+    n = len(values)
+    values = np.append(values, np.nan)
+    first = np.where(count > 0, ends - count, n)
+    last = np.where(count > 0, ends - 1, n)
+    median = (values[(first + last) // 2] + values[(first + last + 1) // 2]) / 2
+    return pd.DataFrame(
+        {
+            'count': count,
+            'mean': mean,
+            'std': std,
+            'median': median,
+            'min': values[first],
+            'max': values[last],
+        },
+        index=pd.Index(cats, name='group'),
+    )
+
+
+def _codes(groups) -> tuple[np.ndarray, list]:
+    cat = pd.Categorical(groups)
+    return np.asarray(cat.codes, dtype=np.int64), cat.categories.tolist()
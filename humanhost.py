@@ -1,23 +1,21 @@
 """Find human-host viruses in our data."""
 
-import json
-
 from matplotlib import pyplot as plt
 from myplot import ctx
 
 from abundance import AbundancePaths, load_data
 from config import WS_DATA_DIR
-from samplenaming import LUNA_GROUPS
+from groupstats import group_values
+from samplenaming import LUNA_GROUPS, sample_table
+from taxonomy import KRK_STD_FILE, Taxonomy
 
 HUHO_TID_FILE = f'{WS_DATA_DIR}/human_host.tid.txt'
 
 
 def main_plot():
-    df = load_data(AbundancePaths.BY_TID, remove_spike=False)
-    print(df.shape)
     # huho = load_human_host()
     huho = {x.strip() for x in open(HUHO_TID_FILE)}
-    df = df.loc[:, [x in huho for x in df]]
+    df = load_data(AbundancePaths.BY_TID, remove_spike=False, columns=huho)
     if df.shape[1] == 0:
         raise RuntimeError('df left with 0 columns after retaining human-host :(')
     print(df.shape)
@@ -25,11 +23,8 @@ def main_plot():
     # return
 
     df[df > 0] = 1
-    counts = df.sum(axis=1).tolist()
-    idx = df.index.tolist()
-    gcounts = [
-        [x for x, l in zip(counts, idx) if l.startswith(g)] for g in LUNA_GROUPS
-    ]
+    groups = sample_table(df.index.tolist()).group
+    gcounts = list(group_values(df.sum(axis=1).values, groups).values())
 
     plt.style.use('bmh')
     with ctx('humanhost', dpi=600, sizeratio=[0.9, 0.3]):
@@ -42,10 +37,8 @@ def main_plot():
 
 
 def main_print():
-    df = load_data(AbundancePaths.tids, remove_spike=False)
-    print(df.shape)
     huho = {x.strip() for x in open(HUHO_TID_FILE)}
-    df = df.loc[:, [x in huho for x in df]]
+    df = load_data(AbundancePaths.BY_TID, remove_spike=False, columns=huho)
     if df.shape[1] == 0:
         raise RuntimeError('df left with 0 columns after retaining human-host :(')
     print(df.shape)
@@ -54,10 +47,11 @@ def main_print():
 
     del df, huho
 
-    krk = json.load(open(f'{WS_DATA_DIR}/krk_std.json'))
-    for x in a:
-        xx = krk[x]
-        print(','.join([xx['Name']] + xx['Accs']))
+    tax = Taxonomy.load(KRK_STD_FILE)
+    nodes = tax.index(a)
+    assert (nodes >= 0).all(), 'tax IDs missing from taxonomy'
+    for name, accs in zip(tax.names[nodes].tolist(), tax.accs[nodes].tolist()):
+        print(','.join([name] + ([accs] if accs else [])))
 
 
 if __name__ == '__main__':
@@ -9,10 +9,10 @@ from typing import Iterable
 import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
-from myplot import ctx
 
-from abundance import AbundancePaths, load_data
+from abundance import AbundancePaths, column_totals, load_data, top_columns, top_k
 from config import DATA_DIR, WS_DATA_DIR
+from render import render
 from samplenaming import LUNA_GROUPS, fix_name2, sample_group
 from violin import violin
 
@@ -71,19 +71,19 @@ def fix_dates(s: Iterable[str]) -> list[str]:
     return [rgx.sub('\\1-\\2-\\3', x) for x in s]
 
 
-def df_top(df: pd.DataFrame, n=10) -> list[str]:
-    sums = df.sum().sort_values(ascending=False)
-    tops = sums.index.tolist()[:n]
+def df_top(df: pd.DataFrame, n=10, totals: np.ndarray = None) -> list[str]:
+    tops = top_columns(df, n, totals)
     if 'Other' in tops:
         tops.remove('Other')
     return tops
 
 
-def jason_plot(df: pd.DataFrame, groups=None):
+def jason_plot(df: pd.DataFrame, groups=None, totals: np.ndarray = None):
     df = df.loc[sorted(df.index.tolist())]
     # df.index = fix_locations(df.index.tolist())
     # df.index = fix_dates(df.index.tolist())
-    tops = df_top(df)
+    top = top_k(df, 10, totals)
+    tops = top.columns.tolist()[:-1]
     plt.style.use('ggplot')
 
     if not groups:
@@ -92,43 +92,54 @@ def jason_plot(df: pd.DataFrame, groups=None):
     nsp = nsubplots(len(groups))
     sp = nsp[1] * 100 + nsp[0] * 10 + 1
 
-    with ctx('jason', dpi=500, sizeratio=(nsp * 0.5).tolist()):
-        for i, g in enumerate(groups):
-            c = colors('plasma', len(tops))
-            # c = colors('tab10')
-            # c = (to_pastel(x) for x in c)
-            plt.subplot(sp + i)
-            df1 = df.loc[[x for x in df.index.tolist() if x.startswith(g)]]
-            bottom = np.zeros(len(df1))
-            xx = df1.index.tolist()
-            xx = [fix_name2(x) for x in xx]
-            for s in tops:
-                yy = df1[s].values
-                if WITH_CMAP:
-                    plt.bar(xx, yy, 0.95, bottom=bottom, label=s, color=next(c))
-                else:
-                    plt.bar(xx, yy, 0.95, bottom=bottom, label=s)
-                bottom += yy
-            plt.bar(
-                xx,
-                1 - bottom,
-                0.95,
-                bottom=bottom,
-                label='Other',
-                color='lightgrey',
-            )
-            plt.xticks(rotation=45, ha='right')
-            plt.ylabel('Relative abundance')
-
-        legend_handles = plt.subplot(sp + 0).get_legend_handles_labels()
-
-    with ctx('jason_legend', dpi=300):
-        plt.legend(*legend_handles, loc='center')
-        plt.gca().axis('off')
-
-
-def comparison_plot(df: pd.DataFrame):
-    tops = df_top(df, 12)
+    render(
+        'jason',
+        jason_figure,
+        top,
+        list(groups),
+        sp,
+        dpi=500,
+        sizeratio=(nsp * 0.5).tolist(),
+    )
+    render('jason_legend', jason_legend_figure, tops, dpi=300)
+
+
+def bar_colors(n: int) -> list:
+    if WITH_CMAP:
+        return list(colors('plasma', n))
+    cycle = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    return [cycle[i % len(cycle)] for i in range(n)]
+
+
+def jason_figure(df: pd.DataFrame, groups: list[str], sp: int):
+    for i, g in enumerate(groups):
+        c = iter(bar_colors(len(df.columns) - 1))
+        # c = colors('tab10')
+        # c = (to_pastel(x) for x in c)
+        plt.subplot(sp + i)
+        df1 = df.loc[[x for x in df.index.tolist() if x.startswith(g)]]
+        bottom = np.zeros(len(df1))
+        xx = df1.index.tolist()
+        xx = [fix_name2(x) for x in xx]
+        for s in df.columns:
+            yy = df1[s].values
+            color = 'lightgrey' if s == 'Other' else next(c)
+            plt.bar(xx, yy, 0.95, bottom=bottom, label=s, color=color)
+            bottom += yy
+        plt.xticks(rotation=45, ha='right')
+        plt.ylabel('Relative abundance')
+
+
+def jason_legend_figure(tops: list[str]):
+    for s, c in zip(tops, bar_colors(len(tops))):
+        plt.bar([], [], label=s, color=c)
+    plt.bar([], [], label='Other', color='lightgrey')
+    plt.legend(loc='center')
+    plt.gca().axis('off')
+
+
+def comparison_plot(df: pd.DataFrame, totals: np.ndarray = None):
+    tops = df_top(df, 12, totals)
     assert 'Other' not in tops
 
     n = len(tops)
@@ -138,16 +149,26 @@ def comparison_plot(df: pd.DataFrame):
     print(n, nrow, ncol)
 
     # plt.style.use('bmh')
-    with ctx('jason_cmp', sizeratio=[ncol * 0.5, nrow * 0.75]):
-        for i, t in enumerate(tops):
-            plt.subplot(nrow, ncol, i + 1)
-            d = {}
-            for g, gdf in df.groupby(sample_group):
-                d[LUNA_GROUPS[g]] = gdf[t].values
-            violin(d, separate_colors=False, rotate_xticks=20)
-            plt.title(t)
-            if i % ncol == 0:
-                plt.ylabel('Relative abundance')
+    render(
+        'jason_cmp',
+        comparison_figure,
+        df[tops],
+        ncol,
+        nrow,
+        sizeratio=[ncol * 0.5, nrow * 0.75],
+    )
+
+
+def comparison_figure(df: pd.DataFrame, ncol: int, nrow: int):
+    for i, t in enumerate(df.columns):
+        plt.subplot(nrow, ncol, i + 1)
+        d = {}
+        for g, gdf in df.groupby(sample_group):
+            d[LUNA_GROUPS[g]] = gdf[t].values
+        violin(d, separate_colors=False, rotate_xticks=20)
+        plt.title(t)
+        if i % ncol == 0:
+            plt.ylabel('Relative abundance')
 
 
 def parse_args() -> argparse.Namespace:
@@ -160,10 +181,11 @@ def parse_args() -> argparse.Namespace:
 def main():
     args = parse_args()
     df = load_data(AbundancePaths.BY_GENUS, remove_spike=True)
+    totals = column_totals(df)
     if args.j:
-        jason_plot(df, LUNA_GROUPS)
+        jason_plot(df, LUNA_GROUPS, totals)
     if args.c:
-        comparison_plot(df)
+        comparison_plot(df, totals)
 
 
 if __name__ == '__main__':
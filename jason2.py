@@ -10,16 +10,19 @@ import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
 from myplot import ctx
-from scipy.spatial.distance import pdist, squareform
+from scipy.spatial.distance import squareform
 from sklearn.decomposition import PCA
 from sklearn.manifold import MDS
 
-from abundance import AbundancePaths, load_data2
+from abundance import AbundancePaths, load_data2, top_columns
 from confidence_ellipse import confidence_ellipse
+from distance import braycurtis
+from render import Job, render_all
 
 # Run parameters.
 ALT_TOP = None
 WITH_CMAP = True
+RENDER_WORKERS = None
 
 
 def colors(name: str, n=None, reverse=False):
@@ -39,15 +42,14 @@ def to_pastel(c):
 
 
 def df_top(df: pd.DataFrame) -> list[str]:
-    sums = df.sum().sort_values(ascending=False)
-    tops = sums.index.tolist()[:10]
-    if ALT_TOP:
-        if type(ALT_TOP) is int:
-            tops = sums.index.tolist()[:ALT_TOP]
-        elif type(ALT_TOP) is list:
-            tops = ALT_TOP
-        else:
-            raise TypeError(f'bad type: {type(ALT_TOP)=}')
+    if not ALT_TOP:
+        tops = top_columns(df, 10)
+    elif type(ALT_TOP) is int:
+        tops = top_columns(df, ALT_TOP)
+    elif type(ALT_TOP) is list:
+        tops = list(ALT_TOP)
+    else:
+        raise TypeError(f'bad type: {type(ALT_TOP)=}')
     if 'Other' in tops:
         tops.remove('Other')
     return tops
@@ -75,47 +77,59 @@ def jason_plot(df: pd.DataFrame):
     # return
 
     # legend_handles = None
+    jobs = [
+        Job(
+            f'abundance_{grp[0]}_{grp[1]}',
+            group_plot,
+            (df.loc[[x[0] for x in groups[grp]]], [x[1] for x in groups[grp]], grp),
+            {'dpi': 500, 'sizeratio': [1.5, 0.75]},
+        )
+        for grp in groups
+    ]
+    render_all(jobs, RENDER_WORKERS)
+
+
+def group_plot(gdf: pd.DataFrame, xx: list[str], grp: tuple[str, str]):
+    """Plots the abundances of a (site, type) group. Runs in a render
+    worker."""
+    plt.style.use('ggplot')
     type_titles = {'INF': 'influent', 'SOL': 'solid'}
 
-    for grp in groups:
-        with ctx(f'abundance_{grp[0]}_{grp[1]}', dpi=500, sizeratio=[1.5, 0.75]):
-            plt.subplot(1, 2, 1)
-            gdf = df.loc[[x[0] for x in groups[grp]]]
-            assert len(gdf) > 0
-            tops = df_top(gdf)
-            c = colors('plasma', len(tops))
-            # c = (to_pastel(x) for x in c)
-            bottom = np.zeros(len(gdf))
-            xx = [x[1] for x in groups[grp]]
-            for s in tops:
-                yy = gdf[s].values
-                if WITH_CMAP:
-                    plt.bar(xx, yy, 0.95, bottom=bottom, label=s, color=next(c))
-                else:
-                    plt.bar(xx, yy, 0.95, bottom=bottom, label=s)
-                bottom += yy
-            plt.bar(
-                xx,
-                1 - bottom,
-                0.95,
-                bottom=bottom,
-                label='Other',
-                color='lightgrey',
-            )
-            plt.xticks(rotation=45, ha='right')
-            plt.ylabel('Relative abundance')
-            plt.title(f'{grp[0]}, {type_titles[grp[1]]}')
+    plt.subplot(1, 2, 1)
+    assert len(gdf) > 0
+    tops = df_top(gdf)
+    c = colors('plasma', len(tops))
+    # c = (to_pastel(x) for x in c)
+    bottom = np.zeros(len(gdf))
+    for s in tops:
+        yy = gdf[s].values
+        if WITH_CMAP:
+            plt.bar(xx, yy, 0.95, bottom=bottom, label=s, color=next(c))
+        else:
+            plt.bar(xx, yy, 0.95, bottom=bottom, label=s)
+        bottom += yy
+    plt.bar(
+        xx,
+        1 - bottom,
+        0.95,
+        bottom=bottom,
+        label='Other',
+        color='lightgrey',
+    )
+    plt.xticks(rotation=45, ha='right')
+    plt.ylabel('Relative abundance')
+    plt.title(f'{grp[0]}, {type_titles[grp[1]]}')
 
-            legend_handles = plt.gca().get_legend_handles_labels()
+    legend_handles = plt.gca().get_legend_handles_labels()
 
-            # with ctx('abundance_legend', dpi=300):
-            plt.subplot(1, 2, 2)
-            plt.legend(*legend_handles, loc='center')
-            plt.gca().axis('off')
+    # with ctx('abundance_legend', dpi=300):
+    plt.subplot(1, 2, 2)
+    plt.legend(*legend_handles, loc='center')
+    plt.gca().axis('off')
 
 
 def nmds_plot(df: pd.DataFrame):
-    d = squareform(pdist(df.values, 'braycurtis'))
+    d = squareform(braycurtis(df))
     print('Distances:', d.shape)
 
     pca = PCA(2).fit_transform(d)
@@ -1,30 +1,53 @@
 """K-mer analysis plotting logic."""
 
-import json
 import re
 
 import numpy as np
-import pandas as pd
 from matplotlib import pyplot as plt
 from myplot import ctx
-from sklearn.decomposition import PCA
+from scipy.spatial.distance import squareform
+from sklearn.manifold import MDS
 
-from samplenaming import fix_name
+import kmerstore
+from kmersim import intersections, jaccard_distances
+from permanova import permanova
+from samplenaming import fix_name, sample_table
 
+KMERS_FILE = 'kmers.json'
 
-def load_data():
-    data = (json.loads(x) for x in open('kmers.json'))
-    names = next(data)
-    data = {x[0]: np.array(x[1], dtype='int8') for x in data}
-    return pd.DataFrame(data, index=names)
+
+def gram_pca(k: np.ndarray, n_components=2) -> np.ndarray:
+    """Returns the PCA projection of samples given their Gram matrix.
+
+    Same as PCA on the data matrix itself: the doubly centered Gram matrix
+    holds the inner products of the centered samples, and its top
+    eigenvectors scaled by the square roots of their eigenvalues are the
+    projections.
+    """
+    n = len(k)
+    h = np.eye(n) - 1 / n
+    vals, vecs = np.linalg.eigh(h @ k @ h)
+    top = np.argsort(vals)[::-1][:n_components]
+    vals, vecs = np.maximum(vals[top], 0), vecs[:, top]
+    # Deterministic signs: largest absolute entry of each component positive.
+    signs = np.sign(vecs[np.abs(vecs).argmax(axis=0), range(len(top))])
+    return vecs * signs * np.sqrt(vals)
 
 
 def main():
     print('Loading data')
-    df = load_data()
-    print(df.shape)
+    store = kmerstore.load(KMERS_FILE)
+    idx = store.samples
+    print(len(idx), 'samples', store.n_kmers, 'k-mers')
+    print('Intersecting')
+    inter = intersections(store)
+    d = jaccard_distances(inter)
+
+    print('PCAing')
+    # For presence bits, the intersections are the Gram matrix.
+    pca = gram_pca(inter.astype(np.float64))
+    print(pca.shape)
 
-    idx = df.index.tolist()
     idx = [fix_name(x) for x in idx]
     group_re = re.compile(r'^([12]\.(Euro|Inh))')
     groups = [group_re.findall(x)[0][0] for x in idx]
@@ -33,15 +56,23 @@ def main():
     colors = [cmap(igroups[g]) for g in groups]
     print(groups)
 
-    print('PCAing')
-    pca = PCA(2).fit_transform(df.values)
-    print(pca.shape)
-
     with ctx('kmers-pca'):
         plt.scatter(pca[:, 0], pca[:, 1], c=colors)
-        for i in range(len(df)):
+        for i in range(len(idx)):
             plt.text(pca[i, 0], pca[i, 1], idx[i], fontsize=6)
 
+    mds_model = MDS(2, metric=False, dissimilarity='precomputed')
+    mds = mds_model.fit_transform(squareform(d), init=pca)
+    print('Stress:', mds_model.stress_)
+    with ctx('kmers-mds'):
+        plt.scatter(mds[:, 0], mds[:, 1], c=colors)
+        plt.title(f'K-mer Jaccard NMDS (stress={mds_model.stress_:.2f})')
+
+    samples = sample_table(idx)
+    for col in ('batch', 'part', 'site'):
+        prmnv = permanova(d, samples[col].tolist(), permutations=100000)
+        print(f'Permanova on {col}: r2={prmnv.r2():.2f} pval={prmnv.pvalue:.2g}')
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,70 @@
+"""Sample similarities from bit-packed k-mer presence."""
+
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+
+import numpy as np
+from scipy.spatial.distance import squareform
+
+from kmerstore import KmerStore
+
+BLOCK_ELEMENTS = 2**22
+"""Maximal number of words in an intermediate AND result."""
+
+
+def intersections(store: KmerStore, workers=None) -> np.ndarray:
+    """Returns the samples x samples numbers of shared k-mers. The diagonal
+    holds the number of k-mers of each sample.
+
+    Stored blocks are split across a thread pool, and each pair of samples is
+    compared with a popcount of the AND of their packed words.
+    """
+    n = len(store.samples)
+    workers = workers or cpu_count()
+    parts = np.array_split(np.arange(store.n_blocks), workers)
+
+    def run(blocks: np.ndarray) -> np.ndarray:
+        result = np.zeros((n, n), dtype=np.int64)
+        for b in blocks:
+            _add_intersections(np.asarray(store.words[b]), result)
+        return result
+
+    with ThreadPoolExecutor(workers) as pool:
+        result = sum(pool.map(run, parts), np.zeros((n, n), dtype=np.int64))
+    return np.triu(result) + np.triu(result, 1).T
+
+
+def _add_intersections(words: np.ndarray, out: np.ndarray):
+    """Adds the intersection counts of a samples x words block to out. Only
+    the upper triangle is complete."""
+    n, w = words.shape
+    step = max(1, BLOCK_ELEMENTS // (n * w))
+    for start in range(0, n, step):
+        end = min(start + step, n)
+        anded = words[start:end, np.newaxis, :] & words[np.newaxis, start:, :]
+        counts = np.bitwise_count(anded).sum(axis=2, dtype=np.int64)
+        out[start:end, start:] += counts
+
+
+def jaccard(inter: np.ndarray) -> np.ndarray:
+    """Returns the Jaccard similarities given an intersections matrix."""
+    sizes = np.diag(inter)
+    union = sizes[:, np.newaxis] + sizes[np.newaxis, :] - inter
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(union > 0, inter / union, 1.0)
+
+
+def containment(inter: np.ndarray) -> np.ndarray:
+    """Returns the ratio of each row sample's k-mers that are found in each
+    column sample, given an intersections matrix."""
+    sizes = np.diag(inter)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(sizes[:, np.newaxis] > 0, inter / sizes[:, np.newaxis], 1.0)
+
+
+def jaccard_distances(inter: np.ndarray) -> np.ndarray:
+    """Returns condensed Jaccard distances given an intersections matrix, in
+    the format of scipy's pdist."""
+    d = 1 - jaccard(inter)
+    np.fill_diagonal(d, 0)
+    return squareform(d, checks=False)
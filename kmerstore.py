@@ -0,0 +1,126 @@
+"""Bit-packed binary storage for k-mer presence matrices.
+
+kmers.json holds a line of sample names, then a line per k-mer with the k-mer
+and a 0/1 list with its presence in each sample. The binary store keeps only
+the presence bits, blocked by k-mers and sample-major within each block:
+
+    magic (8 bytes), header length (uint64), JSON header, uint64 words
+    shaped (n_blocks, n_samples, block_words).
+
+The header holds samples, n_kmers and block_words. Bits are little-endian
+within each word, and the bits past n_kmers in the last block are 0. Loading
+memory-maps the words, so blocks are read and unpacked only when used.
+"""
+
+import json
+import os
+from itertools import islice
+from os import path
+from typing import Iterator
+
+import numpy as np
+
+MAGIC = b'KMERBIT1'
+BLOCK_WORDS = 2**10
+"""Words per sample in each block (64 k-mers per word)."""
+
+
+class KmerStore:
+    """A memory-mapped bit-packed k-mer presence matrix."""
+
+    def __init__(self, file: str):
+        with open(file, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{file}: not a k-mer store')
+            (size,) = np.frombuffer(f.read(8), dtype='<u8')
+            header = json.loads(f.read(int(size)))
+            offset = f.tell()
+        self.samples: list[str] = header['samples']
+        self.n_kmers: int = header['n_kmers']
+        self.block_words: int = header['block_words']
+        self.n_blocks = -(-self.n_kmers // (64 * self.block_words))
+        shape = (self.n_blocks, len(self.samples), self.block_words)
+        if self.n_blocks == 0:  # Cannot memory-map an empty file.
+            self.words = np.zeros(shape, dtype='<u8')
+        else:
+            self.words = np.memmap(
+                file, dtype='<u8', mode='r', offset=offset, shape=shape
+            )
+
+    def block(self, i: int) -> np.ndarray:
+        """Returns the samples x k-mers presence bits of block i, unpacked
+        to uint8."""
+        bits = np.unpackbits(
+            np.ascontiguousarray(self.words[i]).view(np.uint8),
+            axis=1,
+            bitorder='little',
+        )
+        return bits[:, : self.n_kmers - i * 64 * self.block_words]
+
+    def iter_blocks(self) -> Iterator[np.ndarray]:
+        """Yields the unpacked blocks in order."""
+        for i in range(self.n_blocks):
+            yield self.block(i)
+
+
+def store_path(json_file: str) -> str:
+    """Returns the binary store path for a k-mer JSON file."""
+    return json_file.removesuffix('.json') + '.kbits'
+
+
+def is_current(json_file: str) -> bool:
+    """Returns whether the binary store exists and is newer than the JSON, or
+    the JSON is gone."""
+    f = store_path(json_file)
+    if not path.exists(f):
+        return False
+    return not path.exists(json_file) or path.getmtime(f) >= path.getmtime(json_file)
+
+
+def convert(json_file: str, block_words=BLOCK_WORDS):
+    """Converts a k-mer JSON file to the binary store."""
+    with open(json_file) as f:
+        n_kmers = sum(1 for _ in f) - 1
+    names, chunks = json_chunks(json_file, 64 * block_words)
+    header = json.dumps(
+        {'samples': names, 'n_kmers': n_kmers, 'block_words': block_words}
+    ).encode()
+    header += b' ' * (-len(header) % 8)  # Align the words.
+
+    out = store_path(json_file)
+    with open(out + '.tmp', 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array(len(header), dtype='<u8').tobytes())
+        f.write(header)
+        for chunk in chunks:
+            if chunk.size and chunk.max() > 1:
+                raise ValueError(f'{json_file}: non-binary presence values')
+            words = np.zeros((len(names), block_words), dtype='<u8')
+            packed = np.packbits(chunk.astype(bool), axis=1, bitorder='little')
+            words.view(np.uint8)[:, : packed.shape[1]] = packed
+            f.write(words.tobytes())
+    os.replace(out + '.tmp', out)
+
+
+def load(json_file: str) -> KmerStore:
+    """Returns the binary store of a k-mer JSON file, converting the JSON
+    first if its store is missing or outdated."""
+    if not is_current(json_file):
+        convert(json_file)
+    return KmerStore(store_path(json_file))
+
+
+def json_chunks(json_file: str, chunk: int) -> tuple[list[str], Iterator[np.ndarray]]:
+    """Returns the sample names, and an iterator over samples x k-mers
+    presence chunks of a k-mer JSON file."""
+    with open(json_file) as f:
+        names = json.loads(next(f))
+
+    def chunks():
+        with open(json_file) as f:
+            next(f)  # Names.
+            while lines := list(islice(f, chunk)):
+                rows = [json.loads(x)[1] for x in lines]
+                yield np.array(rows, dtype=np.int8).reshape(-1, len(names)).T
+
+    return names, chunks()
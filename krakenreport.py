@@ -0,0 +1,108 @@
+"""Reads Kraken report files.
+
+Each report line is tab-separated: percent, clade reads, taxon reads, rank,
+tax ID and name, where the name is indented by 2 spaces per tree level.
+Reports created with minimizer data have 2 more columns before the rank, so
+the last 3 columns are read from the end.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, NamedTuple, TypeVar
+
+T = TypeVar('T')
+
+
+class Record(NamedTuple):
+    percent: float
+    clade_reads: int
+    """Reads assigned to this taxon and its descendants."""
+    taxon_reads: int
+    """Reads assigned to this taxon directly."""
+    rank: str
+    """Rank code, like 'R', 'D', 'G', 'S' or 'S1'. 'U' for unclassified."""
+    tid: str
+    name: str
+    depth: int
+    """Level in the tree, 0 for the root and unclassified."""
+
+
+def parse_line(line: str) -> Record:
+    parts = line.rstrip('\n').split('\t')
+    raw_name = parts[-1]
+    name = raw_name.lstrip(' ')
+    return Record(
+        float(parts[0]),
+        int(parts[1]),
+        int(parts[2]),
+        parts[-3],
+        parts[-2],
+        name,
+        (len(raw_name) - len(name)) // 2,
+    )
+
+
+def records(file: str) -> Iterator[Record]:
+    """Yields the records of a report in file order."""
+    with open(file) as f:
+        for line in f:
+            if line.strip():
+                yield parse_line(line)
+
+
+def find(file: str, pred: Callable[[Record], bool]) -> Record | None:
+    """Returns the first record that matches pred, or None."""
+    return next((r for r in records(file) if pred(r)), None)
+
+
+def clade_reads(file: str, targets: Iterable[tuple[str, str]]) -> dict:
+    """Returns the clade reads of the given (rank, name) taxa that are in the
+    report. Stops reading once all are found."""
+    missing = set(targets)
+    ranks = {t[0] for t in missing}
+    result = {}
+    with open(file) as f:
+        for line in f:
+            # Check the rank before parsing the whole line.
+            parts = line.rsplit('\t', 3)
+            if len(parts) < 4 or parts[-3] not in ranks:
+                continue
+            r = parse_line(line)
+            if (r.rank, r.name) in missing:
+                missing.remove((r.rank, r.name))
+                result[(r.rank, r.name)] = r.clade_reads
+                if not missing:
+                    break
+                ranks = {t[0] for t in missing}
+    return result
+
+
+def root_count(file: str) -> int:
+    """Returns the number of classified reads."""
+    return clade_reads(file, [('R', 'root')]).get(('R', 'root'), 0)
+
+
+def domain_counts(file: str) -> dict[str, int]:
+    """Returns the clade reads of each domain."""
+    return {r.name: r.clade_reads for r in records(file) if r.rank == 'D'}
+
+
+def taxon_counts(file: str, rank: str, domain: str = None) -> dict[str, int]:
+    """Returns the clade reads of each taxon at the given rank, optionally
+    only within the given domain."""
+    result = {}
+    domain_depth = None  # Depth of the domain while inside it.
+    for r in records(file):
+        if domain_depth is not None and r.depth <= domain_depth:
+            domain_depth = None
+        if r.rank == 'D' and r.name == domain:
+            domain_depth = r.depth
+        if r.rank == rank and (domain is None or domain_depth is not None):
+            result[r.name] = result.get(r.name, 0) + r.clade_reads
+    return result
+
+
+def scan(files: list[str], func: Callable[..., T], *args, workers=None) -> list[T]:
+    """Returns func(file, *args) for each file, computed in a process pool.
+    func must be picklable."""
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(func, files, *[[a] * len(files) for a in args]))
@@ -1,17 +1,18 @@
 import numpy as np
 from matplotlib import pyplot as plt
 from myplot import ctx
-from scipy.stats import mannwhitneyu
 
 from abundance import AbundancePaths, load_data
+from ranktest import bh_correct, mannwhitneyu
 
+SIG_THRESHOLD = 0.05
+MODES = ('vsp',)  # vsp, state1 or state2
+WITH_TITLE = False
 
-def main():
-    SIG_THRESHOLD = 0.05
-    MODE = 'vsp'  # vsp or state
-    WITH_TITLE = False
 
-    match MODE:
+def mode_groups(mode: str) -> tuple[str, list[list[int]]]:
+    """Returns the title and the 2 compared row groups of a mode."""
+    match mode:
         case 'vsp':
             title = 'VSP2 vs VSP1'
             groups = [list(range(18, 36)), list(range(18))]
@@ -28,44 +29,43 @@ def main():
                 list(range(27, 36)),
             ]
         case _:
-            raise ValueError(f'bad mode: {MODE!r}')
+            raise ValueError(f'bad mode: {mode!r}')
+    return title, groups
+
 
+def main():
     df = load_data(AbundancePaths.BY_NAME, remove_spike=True)
-    species = df.columns.tolist()
-    tests = []
+    species = np.array(df.columns.tolist())
+    for mode in MODES:
+        run_mode(df.values, species, mode)
 
-    for spc, sdata in zip(species, df.values.T):
-        a, b = sdata[groups[0]], sdata[groups[1]]
 
-        # Make sure the species appears in both groups.
-        if len(np.nonzero(a)[0]) < 1 or len(np.nonzero(b)[0]) < 1:
-            continue
+def run_mode(values: np.ndarray, species: np.ndarray, mode: str):
+    title, groups = mode_groups(mode)
+    a, b = values[groups[0]], values[groups[1]]
 
-        mw = mannwhitneyu(a, b)
-        effect_size = mw.statistic / (18 * 18)
-        tests.append([spc, float(effect_size), float(mw.pvalue)])
-    print(len(tests), 'tests done')
+    # Make sure the species appears in both groups.
+    present = (a != 0).any(axis=0) & (b != 0).any(axis=0)
+    a, b, species = a[:, present], b[:, present], species[present]
 
-    tests = [x for x in tests if x[2] <= SIG_THRESHOLD]
-    print(len(tests), 'significant before correction')
+    mw = mannwhitneyu(a, b)
+    print(len(species), 'tests done')
+    print((mw.pvalue <= SIG_THRESHOLD).sum(), 'significant before correction')
 
-    # BH correction.
-    tests = sorted(tests, key=lambda x: x[2])
-    for i, spc in enumerate(tests):
-        spc[2] *= len(species) / (i + 1)
-    tests = [x for x in tests if x[2] <= SIG_THRESHOLD]
-    print(len(tests), 'significant after correction')
-    # print([f'{x[0]}:{x[1]:.2f}' for x in tests])
+    sig = bh_correct(mw.pvalue) <= SIG_THRESHOLD
+    print(sig.sum(), 'significant after correction')
 
-    if not tests:
+    if not sig.any():
         return
 
+    names, effects = species[sig], mw.effect_size[sig]
+    order = np.argsort(-effects, kind='stable')
+    names, effects = names[order], effects[order]
+
     cm = plt.get_cmap('plasma')
     plt.style.use('bmh')
-    with ctx('mannwhit-' + MODE, sizeratio=[0.15 * len(tests), 1.5]):
-        tests = sorted(tests, key=lambda x: -x[1])
-        c = [cm(x[1]) for x in tests]
-        plt.bar([x[0] for x in tests], [x[1] for x in tests], color=c)
+    with ctx('mannwhit-' + mode, sizeratio=[0.15 * len(names), 1.5]):
+        plt.bar(names.tolist(), effects, color=[cm(x) for x in effects])
         plt.xticks(rotation=45, ha='right')
         plt.ylabel('Mann-Whitney effect size')
         if WITH_TITLE:
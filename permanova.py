@@ -0,0 +1,126 @@
+"""PERMANOVA test on distance matrices."""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from os import cpu_count
+from typing import Hashable, NamedTuple
+
+import numpy as np
+from scipy.spatial.distance import squareform
+from scipy.stats import norm
+
+EARLY_STOP_CONFIDENCE = 0.999
+"""Confidence of the p-value interval used for early stopping."""
+
+
+class PermanovaResult(NamedTuple):
+    n_samples: int
+    n_groups: int
+    f: float
+    pvalue: float
+    permutations: int
+    """Number of permutations actually evaluated."""
+
+    def r2(self) -> float:
+        """Returns the ratio of variance explained by the grouping."""
+        df1 = self.n_groups - 1
+        df2 = self.n_samples - self.n_groups
+        return (self.f * df1) / (self.f * df1 + df2)
+
+
+def permanova(
+    d: np.ndarray,
+    grouping: list[Hashable],
+    permutations=999,
+    batch_size=1000,
+    workers=None,
+    seed=0,
+    early_stop: float = None,
+) -> PermanovaResult:
+    """Runs a PERMANOVA test on a square or condensed distance matrix.
+
+    Permutations are evaluated in batches, each batch with its own seed
+    derived from the given one, so results do not depend on the number of
+    workers. If early_stop is a significance level, stops once the confidence
+    interval of the p-value is entirely above or below it.
+    """
+    d = np.asarray(d, dtype=np.float64)
+    if d.ndim == 1:
+        d = squareform(d)
+    labels, codes = np.unique(np.asarray(grouping), return_inverse=True)
+    n, k = len(codes), len(labels)
+    if d.shape != (n, n):
+        raise ValueError(f'distance matrix is {d.shape}, grouping has {n} items')
+    if not 1 < k < n:
+        raise ValueError(f'need between 2 and {n - 1} groups, got {k}')
+
+    d2 = d**2
+    f = _pseudo_f(d2, codes[np.newaxis, :], k)[0]
+
+    sizes = [batch_size] * (permutations // batch_size)
+    if permutations % batch_size:
+        sizes.append(permutations % batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    workers = workers or cpu_count()
+
+    hits, done = 0, 0
+    batches = zip(sizes, seeds)
+    with ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=(d2, codes, k, f)
+    ) as pool:
+        # Batches are consumed in submission order, so early stopping does not
+        # depend on scheduling.
+        pending = deque()
+        for size, ss in islice(batches, 2 * workers):
+            pending.append((size, pool.submit(_count_hits, size, ss)))
+        while pending:
+            size, future = pending.popleft()
+            hits += future.result()
+            done += size
+            if early_stop is not None and _settled(hits, done, early_stop):
+                break
+            for size, ss in islice(batches, 1):
+                pending.append((size, pool.submit(_count_hits, size, ss)))
+        for _, future in pending:
+            future.cancel()
+
+    return PermanovaResult(n, k, float(f), (hits + 1) / (done + 1), done)
+
+
+def _pseudo_f(d2: np.ndarray, codes: np.ndarray, k: int) -> np.ndarray:
+    """Returns the pseudo-F statistic for each row of group codes."""
+    n = d2.shape[0]
+    onehot = np.zeros((len(codes), n, k))
+    np.put_along_axis(onehot, codes[:, :, np.newaxis], 1, axis=2)
+    sizes = onehot[0].sum(axis=0)
+    # Sum of squared within-group distances, per permutation and group.
+    within = (onehot * (d2 @ onehot)).sum(axis=1) / 2
+    ss_w = (within / sizes).sum(axis=1)
+    ss_t = d2.sum() / (2 * n)
+    return ((ss_t - ss_w) / (k - 1)) / (ss_w / (n - k))
+
+
+def _settled(hits: int, done: int, alpha: float) -> bool:
+    """Returns whether the p-value confidence interval excludes alpha."""
+    p = (hits + 1) / (done + 1)
+    z = norm.ppf(1 - (1 - EARLY_STOP_CONFIDENCE) / 2)
+    margin = z * np.sqrt(p * (1 - p) / done)
+    return p - margin > alpha or p + margin < alpha
+
+
+_worker_state = None
+
+
+def _init_worker(d2: np.ndarray, codes: np.ndarray, k: int, f: float):
+    global _worker_state
+    _worker_state = (d2, codes, k, f)
+
+
+def _count_hits(size: int, seed: np.random.SeedSequence) -> int:
+    """Returns the number of permutations with a pseudo-F at least as large
+    as the observed one."""
+    d2, codes, k, f = _worker_state
+    rng = np.random.default_rng(seed)
+    perms = rng.permuted(np.tile(codes, (size, 1)), axis=1)
+    return int((_pseudo_f(d2, perms, k) >= f).sum())
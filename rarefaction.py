@@ -0,0 +1,131 @@
+"""Rarefaction curves from read count matrices."""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.special import gammaln
+
+MAX_CELLS = 2**22
+"""Maximal number of depth x taxon cells evaluated at once."""
+
+
+def depth_grid(total: int, step: int) -> np.ndarray:
+    """Returns the depths 0, step, 2*step... up to and including total."""
+    depths = np.arange(0, total + 1, step)
+    if depths[-1] != total:
+        depths = np.append(depths, total)
+    return depths
+
+
+def expected_richness(counts, depths) -> np.ndarray:
+    """Returns the expected number of taxa observed when drawing each depth of
+    reads without replacement from a sample with the given taxon counts.
+
+    Taxon i is missed with probability C(N - c_i, n) / C(N, n). Taxa with
+    equal counts share the computation.
+    """
+    counts = np.asarray(counts)
+    counts = counts[counts > 0]
+    depths = np.asarray(depths)
+    total = int(counts.sum())
+    if (depths > total).any():
+        raise ValueError(f'depths exceed the sample total {total}')
+    values, mult = np.unique(counts, return_counts=True)
+    rest = total - values
+
+    result = np.empty(len(depths))
+    step = max(MAX_CELLS // max(len(values), 1), 1)
+    for i in range(0, len(depths), step):
+        n = depths[i : i + step, np.newaxis]
+        with np.errstate(invalid='ignore'):
+            log_missed = _log_choose(rest, n) - _log_choose(total, n)
+        missed = np.where(rest >= n, np.exp(log_missed), 0)
+        result[i : i + step] = ((1 - missed) * mult).sum(axis=1)
+    return result
+
+
+def simulated_richness(
+    counts, depths, permutations=10, seed: np.random.SeedSequence | int = 0
+) -> np.ndarray:
+    """Returns the average number of taxa observed at each depth over random
+    subsamples.
+
+    Each permutation draws nested subsamples from the largest depth down, so
+    it behaves like reading a single shuffled sample up to each depth.
+    """
+    counts = np.asarray(counts)
+    counts = counts[counts > 0].astype(np.int64)
+    depths = np.asarray(depths)
+    if (depths > counts.sum()).any():
+        raise ValueError(f'depths exceed the sample total {counts.sum()}')
+    order = np.argsort(depths)[::-1]
+    rng = np.random.default_rng(seed)
+
+    result = np.zeros(len(depths))
+    for _ in range(permutations):
+        sub = counts
+        for i in order:
+            sub = rng.multivariate_hypergeometric(sub, depths[i])
+            result[i] += np.count_nonzero(sub)
+    return result / permutations
+
+
+def rarefy(
+    df,
+    step=1000,
+    simulate=False,
+    permutations=10,
+    seed=0,
+    workers=None,
+) -> dict[str, list[list[float]]]:
+    """Returns rarefaction curves of a samples x taxa count data frame or
+    SparseAbundance, as a map from sample name to [depths, taxa observed].
+
+    Curves are analytic expectations, or averages of random subsamples if
+    simulate is true. Each sample gets its own seed derived from the given
+    one, so results do not depend on the number of workers.
+    """
+    values = getattr(df, 'values', df)
+    rows = [_row(values, i) for i in range(values.shape[0])]
+    seeds = np.random.SeedSequence(seed).spawn(len(rows))
+    with ProcessPoolExecutor(workers) as pool:
+        curves = pool.map(
+            _curve,
+            rows,
+            [step] * len(rows),
+            [simulate] * len(rows),
+            [permutations] * len(rows),
+            seeds,
+        )
+        return {
+            name: [x.tolist(), y.tolist()]
+            for name, (x, y) in zip(list(df.index), curves)
+        }
+
+
+def _row(values, i: int) -> np.ndarray:
+    """Returns the nonzero counts of row i of a dense or sparse matrix."""
+    if hasattr(values, 'indptr'):
+        row = values.data[values.indptr[i] : values.indptr[i + 1]]
+    else:
+        row = np.asarray(values[i])
+    if row.dtype.kind not in 'iu' and (row != np.round(row)).any():
+        raise ValueError(f'row {i} has non-integer counts')
+    return row[row > 0].astype(np.int64)
+
+
+def _curve(
+    counts: np.ndarray,
+    step: int,
+    simulate: bool,
+    permutations: int,
+    seed: np.random.SeedSequence,
+) -> tuple[np.ndarray, np.ndarray]:
+    x = depth_grid(int(counts.sum()), step)
+    if simulate:
+        return x, simulated_richness(counts, x, permutations, seed)
+    return x, expected_richness(counts, x)
+
+
+def _log_choose(n, k) -> np.ndarray:
+    return gammaln(n + 1) - gammaln(k + 1) - gammaln(n - k + 1)
@@ -2,17 +2,48 @@
 
 import json
 
+import numpy as np
 from matplotlib import pyplot as plt
 from myplot import ctx
+from scipy import sparse as sp
 
+from abundance import AbundancePaths, SparseAbundance, load_store, report_store
+from rarefaction import rarefy
 from samplenaming import LUNA_GROUPS, fix_name
 
+# Run parameters.
+FROM_REPORTS = False  # Compute curves here instead of reading rrf.json.
+RRF_STEP = 1000
+RRF_SIMULATE = False
 
-def main():
+
+def load_counts(glb=AbundancePaths.REPORTS, name_func=fix_name) -> SparseAbundance:
+    """Returns viral species read counts with an 'Other' column, like
+    rarefy.go. Other holds the unclassified reads and the clade reads of the
+    non-viral domains, so viral reads above species level and reads assigned
+    directly to root are left out."""
+    df = load_store(glb, normalize=False, sparse=True, name_func=name_func)
+    store = report_store(glb, name_func)
+    domains = store.select('D')
+    domains = domains[store.taxa['name'][domains] != 'Viruses']
+    other = store.unclassified + store.counts[:, domains].sum(axis=1)
+    other = dict(zip(store.samples, other.tolist()))
+    rest = np.array([other[x] for x in df.index], dtype=float)
+    values = sp.csr_array(sp.hstack([df.values, rest[:, np.newaxis]]))
+    return SparseAbundance(values, df.index, df.columns + ['Other'])
+
+
+def load_curves() -> dict[str, list[list[int]]]:
+    if FROM_REPORTS:
+        return rarefy(load_counts(), step=RRF_STEP, simulate=RRF_SIMULATE)
     data: dict[str, list[list[int]]] = json.load(open('rrf.json'))
-    data = {
+    return {
         fix_name(k): v for k, v in data.items() if not k.startswith('Undetermined')
     }
+
+
+def main():
+    data = load_curves()
     print(len(data), 'samples')
 
     plt.style.use('bmh')
@@ -0,0 +1,221 @@
+"""Parallel and incremental rendering of figures.
+
+A figure job is a plotting function with its arguments. Each job runs inside
+a myplot ctx, which creates the figure and saves it as a PNG.
+
+Figures are skipped when their output exists and nothing they depend on has
+changed since it was rendered: the arguments, the ctx keyword arguments, the
+source of the plotting function and of the functions it calls from its
+module, and the constants they read. Arguments that are paths of existing
+files are tracked by their modification time and size. The hash of each
+rendered figure is kept in a manifest in the cache directory. Figures with
+arguments or constants that cannot be hashed by content are always rendered.
+"""
+
+import dataclasses
+import inspect
+import json
+import os
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from os import path
+from typing import Any, Callable, NamedTuple
+
+import matplotlib
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+from myplot import ctx
+from scipy import sparse
+
+from cache import array_key, cache_key, cache_path, file_stats
+
+FORCE = False
+"""If true, renders figures even if they are up to date."""
+
+
+class Job(NamedTuple):
+    name: str
+    """Figure name, as given to ctx."""
+    func: Callable
+    """Draws the figure on the current axes. Must be picklable."""
+    args: tuple = ()
+    ctx_kwargs: dict[str, Any] = {}
+    """Keyword arguments for ctx, like dpi and sizeratio."""
+
+    def key(self) -> str | None:
+        """Returns a hash of everything the figure depends on, or None if
+        something cannot be hashed."""
+        try:
+            return cache_key(
+                'render',
+                self.name,
+                _func_digest(self.func),
+                _digest(self.args),
+                _digest(self.ctx_kwargs),
+            )
+        except Unhashable as e:
+            print(f'{self.name}: always rendered, {e}')
+            return None
+
+
+class Unhashable(TypeError):
+    """Raised for values that cannot be hashed by content."""
+
+
+def output_path(name: str) -> str:
+    """Returns the file that ctx saves a figure to."""
+    return f'{name}.png'
+
+
+def render(name: str, func: Callable, *args, **ctx_kwargs) -> str:
+    """Renders a figure in this process, unless it is up to date, and returns
+    its output path."""
+    job = Job(name, func, args, ctx_kwargs)
+    key = job.key()
+    if _is_current(job, key, _load_manifest()):
+        return output_path(name)
+    result = _render(job)
+    if key is not None:
+        _update_manifest({result: key})
+    return result
+
+
+def render_all(
+    jobs: list[Job],
+    max_workers: int = None,
+    memory_limit: int = None,
+    max_tasks_per_child: int = None,
+) -> list[str]:
+    """Renders figures in a process pool with the Agg backend, and returns
+    their output paths in job order. Up-to-date figures are skipped.
+
+    memory_limit caps the address space of each worker in bytes. If
+    max_tasks_per_child is set, workers are replaced after that many figures,
+    which releases memory that matplotlib holds on to.
+    """
+    manifest = _load_manifest()
+    keys = [job.key() for job in jobs]
+    stale = [
+        (job, key)
+        for job, key in zip(jobs, keys)
+        if not _is_current(job, key, manifest)
+    ]
+    print(f'{len(jobs) - len(stale)} of {len(jobs)} figures up to date')
+
+    if stale:
+        with ProcessPoolExecutor(
+            max_workers,
+            initializer=_init_worker,
+            initargs=(memory_limit,),
+            max_tasks_per_child=max_tasks_per_child,
+        ) as pool:
+            futures = [pool.submit(_render, job) for job, _ in stale]
+            results = [f.result() for f in futures]
+            _update_manifest(
+                {r: key for r, (_, key) in zip(results, stale) if key is not None}
+            )
+    return [output_path(job.name) for job in jobs]
+
+
+def _init_worker(memory_limit: int | None):
+    matplotlib.use('Agg')
+    if memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _render(job: Job) -> str:
+    with ctx(job.name, **job.ctx_kwargs):
+        job.func(*job.args)
+    plt.close('all')
+    return output_path(job.name)
+
+
+def _is_current(job: Job, key: str | None, manifest: dict[str, str]) -> bool:
+    f = output_path(job.name)
+    return (
+        not FORCE
+        and key is not None
+        and path.exists(f)
+        and manifest.get(path.abspath(f)) == key
+    )
+
+
+def _manifest_path() -> str:
+    return cache_path('render-manifest', '.json')
+
+
+def _load_manifest() -> dict[str, str]:
+    f = _manifest_path()
+    if not path.exists(f):
+        return {}
+    with open(f) as inp:
+        return json.load(inp)
+
+
+def _update_manifest(entries: dict[str, str]):
+    manifest = _load_manifest()
+    manifest.update({path.abspath(k): v for k, v in entries.items()})
+    f = _manifest_path()
+    with open(f + '.tmp', 'w') as out:
+        json.dump(manifest, out)
+    os.replace(f + '.tmp', f)
+
+
+def _func_digest(func: Callable, seen: set = None) -> list:
+    """Returns the source of a function, the global constants it reads and
+    the digests of functions from its module that it calls."""
+    seen = seen if seen is not None else set()
+    seen.add(func)
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = None
+    globs = getattr(func, '__globals__', {})
+    deps = {}
+    for name in getattr(getattr(func, '__code__', None), 'co_names', ()):
+        if name not in globs:
+            continue
+        value = globs[name]
+        if isinstance(value, _CONSTANT_TYPES):
+            deps[name] = _digest(value)
+        elif (
+            inspect.isfunction(value)
+            and value.__module__ == func.__module__
+            and value not in seen
+        ):
+            deps[name] = _func_digest(value, seen)
+    return [func.__module__, func.__qualname__, source, deps]
+
+
+_CONSTANT_TYPES = (str, int, float, bool, tuple, list, dict, set, frozenset, type(None))
+
+
+def _digest(x):
+    """Returns a JSON-serializable representation of x for hashing. Raises
+    Unhashable for values that cannot be hashed by content."""
+    if isinstance(x, np.generic):
+        return _digest(x.item())
+    if isinstance(x, np.ndarray):
+        return array_key(x) if x.dtype != object else _digest(x.tolist())
+    if isinstance(x, (pd.DataFrame, pd.Series)):
+        hashes = pd.util.hash_pandas_object(x, index=True).values
+        columns = x.columns.tolist() if isinstance(x, pd.DataFrame) else x.name
+        return [array_key(hashes), _digest(columns)]
+    if sparse.issparse(x):
+        x = x.tocsr()
+        return [list(x.shape), array_key(x.data, x.indices, x.indptr)]
+    if isinstance(x, (list, tuple)):
+        return [_digest(v) for v in x]
+    if isinstance(x, dict):
+        return [[_digest(k), _digest(v)] for k, v in x.items()]
+    if isinstance(x, (set, frozenset)):
+        return sorted((_digest(v) for v in x), key=json.dumps)
+    if dataclasses.is_dataclass(x) and not isinstance(x, type):
+        fields = dataclasses.fields(x)
+        return [type(x).__qualname__, [_digest(getattr(x, f.name)) for f in fields]]
+    if isinstance(x, str) and path.isfile(x):
+        return file_stats([x])
+    if isinstance(x, (str, int, float, bool, type(None))):
+        return x
+    raise Unhashable(f'cannot hash {type(x).__qualname__}')
@@ -0,0 +1,132 @@
+"""Consolidated store of clade read counts from Kraken reports.
+
+A store is a directory with the samples x taxa clade read counts of all
+ranks as a CSC matrix (data.npy, indices.npy, indptr.npy), and meta.json
+with the sample names, their root and unclassified counts, and a tid, name,
+rank, domain and parent tax ID per taxon. The arrays are memory-mapped, and
+CSC makes selecting the taxa of one rank or domain cheap.
+"""
+
+import json
+import os
+import shutil
+from os import path
+
+import numpy as np
+from scipy import sparse as sp
+
+import krakenreport
+from cache import cache_key, cache_path, file_stats
+
+META_FIELDS = ('tid', 'name', 'rank', 'domain', 'parent')
+
+
+class ReportStore:
+    """A memory-mapped store of clade read counts."""
+
+    def __init__(self, store_dir: str):
+        with open(path.join(store_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        self.samples: list[str] = meta['samples']
+        self.root = np.array(meta['root'], dtype=np.int64)
+        self.unclassified = np.array(meta['unclassified'], dtype=np.int64)
+        self.taxa = {k: np.array(meta['taxa'][k], dtype=str) for k in META_FIELDS}
+        arrays = [
+            np.load(path.join(store_dir, f'{x}.npy'), mmap_mode='r')
+            for x in ('data', 'indices', 'indptr')
+        ]
+        self.counts = sp.csc_array(
+            tuple(arrays), shape=(len(self.samples), len(self.taxa['tid']))
+        )
+
+    def select(self, rank: str = None, domain: str = None) -> np.ndarray:
+        """Returns the column numbers of taxa at the given rank and domain."""
+        mask = np.ones(len(self.taxa['tid']), dtype=bool)
+        if rank is not None:
+            mask &= self.taxa['rank'] == rank
+        if domain is not None:
+            mask &= self.taxa['domain'] == domain
+        return np.flatnonzero(mask)
+
+    def totals(self) -> np.ndarray:
+        """Returns the number of reads in each sample, classified or not."""
+        return self.root + self.unclassified
+
+
+def load(files: list[str], names: list[str], workers=None) -> ReportStore:
+    """Returns the store of the given reports, building it in the cache
+    directory if the reports changed."""
+    out = cache_path(cache_key('reportstore', file_stats(files), names), '.store')
+    if not path.exists(out):
+        build(files, names, out, workers)
+    return ReportStore(out)
+
+
+def build(files: list[str], names: list[str], out: str, workers=None):
+    """Parses reports in a process pool and writes their store to the out
+    directory."""
+    columns: dict[str, int] = {}
+    meta = {k: [] for k in META_FIELDS}
+    rows, cols, vals = [], [], []
+    root, unclassified = [], []
+    parsed = krakenreport.scan(files, _parse_report, workers=workers)
+    for i, (taxa, counts, r, u) in enumerate(parsed):
+        idx = np.empty(len(taxa), dtype=np.int64)
+        for j, t in enumerate(taxa):
+            if (c := columns.get(t[0])) is None:
+                c = columns[t[0]] = len(columns)
+                for k, x in zip(META_FIELDS, t):
+                    meta[k].append(x)
+            idx[j] = c
+        rows.append(np.full(len(idx), i))
+        cols.append(idx)
+        vals.append(counts)
+        root.append(r)
+        unclassified.append(u)
+
+    shape = (len(files), len(columns))
+    if columns:
+        rows, cols, vals = map(np.concatenate, (rows, cols, vals))
+    counts = sp.csc_array((vals, (rows, cols)), shape=shape, dtype=np.int64)
+    counts.sum_duplicates()
+
+    tmp = out + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for x in ('data', 'indices', 'indptr'):
+        np.save(path.join(tmp, f'{x}.npy'), getattr(counts, x))
+    with open(path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(
+            {
+                'samples': names,
+                'root': root,
+                'unclassified': unclassified,
+                'taxa': meta,
+            },
+            f,
+        )
+    os.replace(tmp, out)
+
+
+def _parse_report(
+    file: str,
+) -> tuple[list[tuple[str, str, str, str, str]], np.ndarray, int, int]:
+    """Returns the (tid, name, rank, domain, parent) of each taxon in a
+    report, their clade reads, and the root and unclassified counts."""
+    taxa, counts = [], []
+    root = unclassified = 0
+    stack: list[tuple[str, str]] = []  # (tid, domain) by depth.
+    for r in krakenreport.records(file):
+        if r.rank == 'U':
+            unclassified += r.clade_reads
+            continue
+        if r.rank == 'R':
+            root += r.clade_reads
+        del stack[r.depth :]
+        parent, domain = stack[-1] if stack else ('', '')
+        if r.rank == 'D':
+            domain = r.name
+        stack.append((r.tid, domain))
+        taxa.append((r.tid, r.name, r.rank, domain, parent))
+        counts.append(r.clade_reads)
+    return taxa, np.array(counts, dtype=np.int64), root, unclassified
@@ -3,11 +3,12 @@
 from glob import glob
 
 from matplotlib import pyplot as plt
-from myplot import ctx
 from scipy.stats import mannwhitneyu
 
 from config import DATA_DIR
-from samplenaming import LUNA_GROUPS, fix_name
+from groupstats import group_values
+from render import render
+from samplenaming import LUNA_GROUPS, fix_name, sample_table
 from violin import violin
 
 NREADS_FILES = f'{DATA_DIR}/ww-greengenes/*.nreads'
@@ -39,46 +40,51 @@ def plot_bars_single(d: dict[str, float], ymax=None):
 
 def plot_bars(data: dict[str, tuple[int, int]]):
     data = {k: v[1] / v[0] for k, v in data.items()}
+    render('rrna', bars_figure, data, sizeratio=2)
+
+
+def bars_figure(data: dict[str, float]):
     mx = max(data.values()) * 1.1
-    with ctx('rrna', sizeratio=2):
-        for i, g in enumerate(LUNA_GROUPS):
-            plt.subplot(221 + i)
-            gdata = {k: v for k, v in data.items() if k.startswith(g)}
-            plot_bars_single(gdata, ymax=mx)
+    for i, g in enumerate(LUNA_GROUPS):
+        plt.subplot(221 + i)
+        gdata = {k: v for k, v in data.items() if k.startswith(g)}
+        plot_bars_single(gdata, ymax=mx)
 
 
 def plot_violins(data: dict[str, tuple[int, int]]):
-    data = {k: v[1] / v[0] for k, v in data.items()}
-    d = {}
-    for g in LUNA_GROUPS:
-        gdata = {k: v for k, v in data.items() if k.startswith(g)}
-        if not gdata:
-            continue
-        d[LUNA_GROUPS[g]] = list(gdata.values())
+    ratios = [v[1] / v[0] for v in data.values()]
+    groups = sample_table(list(data)).group
+    d = {
+        LUNA_GROUPS[g]: x.tolist()
+        for g, x in group_values(ratios, groups).items()
+        if len(x)
+    }
 
     p1 = mannwhitneyu(d['v1 solid'], d['v1 influent']).pvalue
     p2 = mannwhitneyu(d['v2 solid'], d['v2 influent']).pvalue
     print(f'Mann-Whitney 1 p={p1:.2f}')
     print(f'Mann-Whitney 2 p={p2:.2f}')
 
+    # plt.style.use('bmh')
+    render('rrna_violin', violins_figure, d, p1, p2, sizeratio=0.75, dpi=400)
+
+
+def violins_figure(d: dict[str, list[float]], p1: float, p2: float):
     mx = max(x for v in d.values() for x in v) * 1.1
+    violin(d)
+    plt.ylabel('Ratio of reads mapped to GreenGenes')
 
-    # plt.style.use('bmh')
-    with ctx('rrna_violin', sizeratio=0.75, dpi=400):
-        violin(d)
-        plt.ylabel('Ratio of reads mapped to GreenGenes')
-
-        # Draw p-value bars.
-        plt.plot([1, 1, 2, 2], [mx, mx * 1.05, mx * 1.05, mx], 'k')
-        plt.text(1.5, mx * 1.07, f'p={p1:.2f}', horizontalalignment='center')
-        plt.plot([3, 3, 4, 4], [mx, mx * 1.05, mx * 1.05, mx], 'k')
-        plt.text(3.5, mx * 1.07, f'p={p2:.2f}', horizontalalignment='center')
-
-        # Extend Y-limit because it doesn't automatically take the text in
-        # consideration.
-        ylim = list(plt.ylim())
-        ylim[1] *= 1.05
-        plt.ylim(ylim)
+    # Draw p-value bars.
+    plt.plot([1, 1, 2, 2], [mx, mx * 1.05, mx * 1.05, mx], 'k')
+    plt.text(1.5, mx * 1.07, f'p={p1:.2f}', horizontalalignment='center')
+    plt.plot([3, 3, 4, 4], [mx, mx * 1.05, mx * 1.05, mx], 'k')
+    plt.text(3.5, mx * 1.07, f'p={p2:.2f}', horizontalalignment='center')
+
+    # Extend Y-limit because it doesn't automatically take the text in
+    # consideration.
+    ylim = list(plt.ylim())
+    ylim[1] *= 1.05
+    plt.ylim(ylim)
 
 
 def main():
@@ -3,6 +3,8 @@
 import re
 from os.path import basename
 
+import pandas as pd
+
 SAMPLE_NAME_MAPPING = {
     "A1": "Euro_Tur_111622",
     "A2": "Inh_Tur_111622",
@@ -52,6 +54,8 @@ LUNA_GROUPS = {
 
 _sample_name_re = re.compile(r'((Euro|Inh)_([a-zA-Z]+)_([0-9]+))')
 
+_sample_fields_re = re.compile(r'^(([12])\.(Euro|Inh))_([a-zA-Z]+)_([0-9]+)')
+
 _sample_group_re = re.compile(
     '^(' + '|'.join([re.escape(g) for g in LUNA_GROUPS] + ['']) + ')'
 )
@@ -70,3 +74,24 @@ def fix_name2(s: str) -> str:
 
 def sample_group(s: str) -> str:
     return _sample_group_re.findall(s)[0]
+
+
+def sample_table(names: list[str]) -> pd.DataFrame:
+    """Returns sample metadata parsed from fixed sample names, indexed by name.
+
+    Columns are categorical: group (ordered like LUNA_GROUPS), batch, part,
+    site and date. Names that do not match get missing values.
+    """
+    rows = []
+    for s in names:
+        m = _sample_fields_re.findall(s)
+        rows.append(m[0] if m else (None,) * 5)
+    df = pd.DataFrame(
+        rows,
+        index=pd.Index(names, name='name'),
+        columns=['group', 'batch', 'part', 'site', 'date'],
+    )
+    df['group'] = pd.Categorical(df['group'], categories=list(LUNA_GROUPS))
+    for c in ('batch', 'part', 'site', 'date'):
+        df[c] = df[c].astype('category')
+    return df
@@ -0,0 +1,136 @@
+"""Kraken taxonomy compiled into arrays for vectorized lookups."""
+
+import json
+import os
+from os import path
+
+import numpy as np
+
+from cache import cache_key, cache_path, file_stats
+from config import WS_DATA_DIR
+
+KRK_STD_FILE = f'{WS_DATA_DIR}/krk_std.json'
+KRK_STD2_FILE = f'{WS_DATA_DIR}/krk_std2.json'
+ROOT_LEVEL = 'R'
+
+
+class Taxonomy:
+    """A taxonomy tree stored as parallel arrays.
+
+    Nodes are numbered 0..n-1. parent holds each node's parent number, or -1
+    for the root. Levels are Kraken rank codes ('S', 'S1', 'G', 'P'...),
+    stored as indexes into level_names.
+    """
+
+    def __init__(
+        self,
+        tids: np.ndarray,
+        parent: np.ndarray,
+        levels: np.ndarray,
+        level_names: np.ndarray,
+        names: np.ndarray,
+        accs: np.ndarray,
+    ):
+        self.tids = tids
+        self.parent = parent
+        self.levels = levels
+        self.level_names = level_names
+        self.names = names
+        self.accs = accs
+        """Comma-separated accessions of each node."""
+        self._tid_order = np.argsort(tids)
+
+    @classmethod
+    def load(cls, file: str) -> 'Taxonomy':
+        """Loads a taxonomy JSON file created by krktax.
+
+        The compiled arrays are cached on disk, so the JSON is parsed only
+        when it changes.
+        """
+        f = cache_path(cache_key('taxonomy', file_stats([file])), '.npz')
+        if not path.exists(f):
+            tmp = f + '.tmp.npz'
+            np.savez(tmp, **_compile(file))
+            os.replace(tmp, f)
+        with np.load(f, allow_pickle=False) as npz:
+            return cls(**{k: npz[k] for k in npz.files})
+
+    def __len__(self) -> int:
+        return len(self.tids)
+
+    def index(self, tids) -> np.ndarray:
+        """Returns the node numbers of the given tax IDs, -1 for unknown IDs."""
+        tids = np.asarray(tids, dtype=str)
+        pos = np.searchsorted(self.tids, tids, sorter=self._tid_order)
+        pos = np.minimum(pos, len(self) - 1)
+        nodes = self._tid_order[pos]
+        return np.where(self.tids[nodes] == tids, nodes, -1)
+
+    def level_mask(self, *prefixes: str) -> np.ndarray:
+        """Returns a mask of nodes whose level starts with one of the given
+        prefixes."""
+        ok = np.array([x.startswith(prefixes) for x in self.level_names.tolist()])
+        return ok[self.levels]
+
+    def ancestor_at(self, nodes, level: str, via: tuple[str, ...] = None) -> np.ndarray:
+        """Returns the closest ancestor of each node (or the node itself) at the
+        given level, -1 if there is none.
+
+        If via is given, the walk up also stops with -1 at any node whose level
+        does not start with one of its prefixes.
+        """
+        nodes = np.asarray(nodes)
+        result = np.full(len(nodes), -1)
+        targets = self.level_names == level
+        stops = self.level_names == ROOT_LEVEL
+        if via is not None:
+            stops |= ~np.array([x.startswith(via) for x in self.level_names.tolist()])
+
+        active = np.flatnonzero(nodes >= 0)
+        cur = nodes[active]
+        while len(cur):
+            lv = self.levels[cur]
+            found = targets[lv]
+            result[active[found]] = cur[found]
+            cont = ~found & ~stops[lv] & (self.parent[cur] >= 0)
+            active, cur = active[cont], self.parent[cur[cont]]
+        return result
+
+    def descendants(self, nodes) -> np.ndarray:
+        """Returns the given nodes and all their descendants."""
+        mask = np.zeros(len(self), dtype=bool)
+        mask[np.asarray(nodes)] = True
+        frontier = mask.copy()
+        has_parent = self.parent >= 0
+        while frontier.any():
+            frontier = has_parent & frontier[self.parent] & ~mask
+            mask |= frontier
+        return np.flatnonzero(mask)
+
+
+def _compile(file: str) -> dict[str, np.ndarray]:
+    with open(file) as f:
+        raw: dict[str, dict] = json.load(f)
+    tids = list(raw)
+    numbers = {tid: i for i, tid in enumerate(tids)}
+    level_names = sorted({x['Level'] for x in raw.values()})
+    level_numbers = {x: i for i, x in enumerate(level_names)}
+
+    parent = np.full(len(tids), -1, dtype=np.int32)
+    for i, x in enumerate(raw.values()):
+        p = numbers.get(x['ParentTID'], -1)
+        if x['Level'] != ROOT_LEVEL and p != i:
+            parent[i] = p
+
+    return {
+        'tids': np.array(tids, dtype=str),
+        'parent': parent,
+        'levels': np.array(
+            [level_numbers[x['Level']] for x in raw.values()], dtype=np.int16
+        ),
+        'level_names': np.array(level_names, dtype=str),
+        'names': np.array([x['Name'] for x in raw.values()], dtype=str),
+        'accs': np.array(
+            [','.join(x.get('Accs') or []) for x in raw.values()], dtype=str
+        ),
+    }
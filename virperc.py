@@ -7,21 +7,16 @@ from glob import glob
 from matplotlib import pyplot as plt
 from myplot import ctx
 
+import krakenreport
 from violin import violin
 
+ROOT = ('R', 'root')
+VIRUSES = ('D', 'Viruses')
 
-def read_file(f: str):
-    rgx = re.compile('\\S+')
-    root, vir = None, None
-    for line in open(f):
-        parts = rgx.findall(line)
-        if parts[3] == 'R':
-            root = int(parts[1])
-        if parts[3] == 'D' and parts[5] == 'Viruses':
-            vir = int(parts[1])
-        if root and vir:
-            break
-    return vir / root
+
+def read_file(f: str) -> float:
+    counts = krakenreport.clade_reads(f, [ROOT, VIRUSES])
+    return counts[VIRUSES] / counts[ROOT]
 
 
 def main():
@@ -29,12 +24,10 @@ def main():
     files = glob('../../../Data/ww2-kraken/*.krk.txt')
     rgx = re.compile('_INF_|_SOL_')
     names = {'_INF_': 'Influent', '_SOL_': 'Solid'}
+    files = [f for f in files if rgx.findall(f)]
     d = defaultdict(list)
-    for f in files:
-        g = rgx.findall(f)
-        if not g:
-            continue
-        d[names[g[0]]].append(read_file(f))
+    for f, r in zip(files, krakenreport.scan(files, read_file)):
+        d[names[rgx.findall(f)[0]]].append(r)
 
     print([(k, len(v)) for k, v in d.items()])
 